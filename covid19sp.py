@@ -8,254 +8,1114 @@ na cidade e no estado de São Paulo.
 @author: https://github.com/DaviSRodrigues
 """
 
+from concurrent.futures import as_completed, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from io import StringIO
+from functools import lru_cache
+import hashlib
+from io import BytesIO, StringIO
+import json
 import locale
 from math import isnan, nan
 from tableauscraper import TableauScraper
+from threading import Lock
 import traceback
+import os
+import pickle
 import sys
 import unicodedata
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.subplots import make_subplots
 import requests
 
+try:
+    import pyarrow  # noqa: F401 (necessário para o armazenamento colunar em Parquet)
+except ImportError:
+    pyarrow = None
 
-def main():
+
+def main(dias_reprocessamento=0):
+    # com dias_reprocessamento > 0, os dados são carregados e tratados uma única vez; apenas a campanha de
+    # vacinação é atualizada dia a dia até data_processamento, e os gráficos são gerados só para o último dia
+    global data_processamento
     locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
 
-    print(f'Carregando dados... {datetime.now():%H:%M:%S}')
-    hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total = carrega_dados_cidade()
-    dados_munic, dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, doses_aplicadas, doses_recebidas, dados_imunizantes, atualizacao_imunizantes = carrega_dados_estado()
+    respostas_http.clear()
+    identidades_remotas.clear()
+
+    if dias_reprocessamento == 0:
+        print(f'Verificando alterações nas fontes de dados... {datetime.now():%H:%M:%S}')
+        verifica_fontes_remotas()
+
+        if calcula_impressao_digital() == le_impressao_digital():
+            print('\tNenhuma fonte de dados foi alterada desde a última execução.\n\nFim')
+            return
+
+    print(f'\nCarregando dados... {datetime.now():%H:%M:%S}')
+    dados = {**carrega_dados_cidade(), **carrega_dados_estado()}
+    assinaturas = {}
+    atualiza_dados(dados, assinaturas, dados)
 
     print(f'\nLimpando e enriquecendo dos dados... {datetime.now():%H:%M:%S}')
-    dados_cidade, dados_munic, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total, dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, dados_imunizantes = pre_processamento(hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total, dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, doses_aplicadas, doses_recebidas, dados_munic, dados_imunizantes, atualizacao_imunizantes)
-    evolucao_cidade, evolucao_estado = gera_dados_evolucao_pandemia(dados_munic, dados_estado, isolamento, dados_vacinacao, internacoes)
-    evolucao_cidade, evolucao_estado = gera_dados_semana(evolucao_cidade, evolucao_estado, leitos_estaduais, isolamento, internacoes)
+    pre_processamento(dados, assinaturas)
+
+    ultimo_dia = data_processamento
+    entradas_vacinacao = ('dados_vacinacao', 'doses_aplicadas', 'doses_recebidas', 'internacoes', 'dados_imunizantes', 'atualizacao_imunizantes')
+    saidas_vacinacao = ('dados_vacinacao', 'dados_imunizantes')
+    dados_vacinacao_dia = {nome: dados[nome] for nome in ('doses_aplicadas', 'doses_recebidas', 'atualizacao_imunizantes')}
+
+    for i in range(dias_reprocessamento, 0, -1):
+        data_processamento = ultimo_dia - timedelta(days=i)
+        print(f'\nDia em processamento -> {data_processamento:%d/%m/%Y}\n')
+        doses_aplicadas_dia, doses_recebidas_dia, atualizacao_imunizantes_dia = carrega_dados_vacinacao()
+        atualiza_dados(dados, assinaturas, {'doses_aplicadas': doses_aplicadas_dia,
+                                            'doses_recebidas': doses_recebidas_dia,
+                                            'atualizacao_imunizantes': atualizacao_imunizantes_dia})
+        executa_etapa('Campanha de vacinação', pre_processamento_vacinacao, entradas_vacinacao, saidas_vacinacao, dados, assinaturas)
+
+    data_processamento = ultimo_dia
+
+    if dias_reprocessamento > 0:
+        print(f'\nDia em processamento -> {data_processamento:%d/%m/%Y}\n')
+        atualiza_dados(dados, assinaturas, dados_vacinacao_dia)
+
+    executa_etapa('Campanha de vacinação', pre_processamento_vacinacao, entradas_vacinacao, saidas_vacinacao, dados, assinaturas)
+
+    print('\tIndexando dados por região e data...')
+    monta_visoes(dados, assinaturas)
+    executa_etapa('Processando dados da evolução da pandemia', gera_dados_evolucao_pandemia,
+                  ('visao_munic', 'dados_estado', 'visao_isolamento', 'visao_vacinacao', 'visao_internacoes'),
+                  ('evolucao_cidade', 'evolucao_estado'), dados, assinaturas)
+    executa_etapa('Processando dados semanais', gera_dados_semana,
+                  ('evolucao_cidade', 'evolucao_estado', 'leitos_estaduais', 'visao_isolamento', 'visao_internacoes'),
+                  ('evolucao_cidade', 'evolucao_estado'), dados, assinaturas)
 
     print(f'\nGerando gráficos e tabelas... {datetime.now():%H:%M:%S}')
-    gera_graficos(dados_munic, dados_cidade, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total, dados_estado, isolamento, leitos_estaduais, evolucao_cidade, evolucao_estado, internacoes, doencas, dados_raciais, dados_vacinacao, dados_imunizantes)
+    gera_graficos(dados, assinaturas)
 
     print(f'\nAtualizando serviceWorker.js... {datetime.now():%H:%M:%S}')
-    atualiza_service_worker(dados_estado)
+    atualiza_service_worker(dados['dados_estado'])
+    grava_impressao_digital(calcula_impressao_digital())
 
     print('\nFim')
 
 
 def carrega_dados_cidade():
-    hospitais_campanha = pd.read_csv('dados/hospitais_campanha_sp.csv', sep=',')
-    leitos_municipais = pd.read_csv('dados/leitos_municipais.csv', sep=',')
-    leitos_municipais_privados = pd.read_csv('dados/leitos_municipais_privados.csv', sep=',')
-    leitos_municipais_total = pd.read_csv('dados/leitos_municipais_total.csv', sep=',')
+    hospitais_campanha = le_csv_local('dados/hospitais_campanha_sp.csv', sep=',')
+    leitos_municipais = le_csv_local('dados/leitos_municipais.csv', sep=',')
+    leitos_municipais_privados = le_csv_local('dados/leitos_municipais_privados.csv', sep=',')
+    leitos_municipais_total = le_csv_local('dados/leitos_municipais_total.csv', sep=',')
 
-    return hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total
+    return {'hospitais_campanha': hospitais_campanha,
+            'leitos_municipais': leitos_municipais,
+            'leitos_municipais_privados': leitos_municipais_privados,
+            'leitos_municipais_total': leitos_municipais_total}
 
 
 def carrega_dados_estado():
-    hoje = data_processamento
-    ano = hoje.strftime('%Y')
-    mes = hoje.strftime('%m')
-    data = hoje.strftime('%Y%m%d')
+    # cada fonte tem sua própria sequência de tentativas e seu arquivo local de contingência;
+    # os downloads são feitos em paralelo, de modo que o tempo total é o da fonte mais lenta
+    fontes = {'dados_munic': carrega_dados_munic,
+              'dados_estado': carrega_dados_estado_sp,
+              'isolamento': carrega_isolamento,
+              'internacoes': carrega_internacoes,
+              'doencas': carrega_doencas,
+              'dados_raciais': carrega_dados_raciais,
+              'doses_aplicadas': carrega_doses_aplicadas,
+              'doses_recebidas': carrega_doses_recebidas,
+              'atualizacao_imunizantes': carrega_atualizacao_imunizantes}
+
+    if vacinacao is True:
+        print('\tAtualizando dados da campanha de vacinação...')
+
+    with ThreadPoolExecutor(max_workers=len(fontes)) as executor:
+        futuros = {nome: executor.submit(fonte) for nome, fonte in fontes.items()}
+        dados = {nome: futuro.result() for nome, futuro in futuros.items()}
+
+    dados['leitos_estaduais'] = aplica_esquema(le_csv_local('dados/leitos_estaduais.csv', index_col=0), 'leitos_estaduais')
+    dados['dados_vacinacao'] = aplica_esquema(le_csv_local('dados/dados_vacinacao.zip'), 'dados_vacinacao')
+    dados['dados_imunizantes'] = le_csv_local('dados/dados_imunizantes.csv')
+
+    return dados
+
+
+# validadores (ETag/Last-Modified) dos arquivos baixados do GitHub, gravados junto com as cópias locais
+ARQUIVO_CACHE_HTTP = 'dados/cache_http.json'
+trava_cache_http = Lock()
+
+# limite (conexão, leitura) em segundos de cada requisição: uma fonte que não responde segue o mesmo caminho de
+# um erro de conexão, e os dados são lidos da cópia local
+TEMPO_LIMITE_REQUISICAO = (15, 120)
+
+# impressão digital das entradas da última execução bem-sucedida
+ARQUIVO_IMPRESSAO_DIGITAL = 'dados/impressao_digital.txt'
+
+# fontes remotas com validadores e suas cópias locais
+FONTES_GITHUB = {'https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/dados_covid_sp.csv': 'dados/dados_munic.zip',
+                 'https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/sp.csv': 'dados/dados_estado_sp.csv',
+                 'https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/plano_sp_leitos_internacoes.csv': 'dados/internacoes.csv',
+                 'https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/casos_obitos_doencas_preexistentes.csv.zip': 'dados/doencas_preexistentes.zip',
+                 'https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/casos_obitos_raca_cor.csv.zip': 'dados/dados_raciais.zip'}
+
+# arquivos locais lidos por carrega_dados_cidade e carrega_dados_estado
+ARQUIVOS_ENTRADA = ['dados/hospitais_campanha_sp.csv', 'dados/leitos_municipais.csv', 'dados/leitos_municipais_privados.csv',
+                    'dados/leitos_municipais_total.csv', 'dados/dados_munic.zip', 'dados/dados_estado_sp.csv',
+                    'dados/isolamento_social.csv', 'dados/internacoes.csv', 'dados/doencas_preexistentes.zip',
+                    'dados/dados_raciais.zip', 'dados/leitos_estaduais.csv', 'dados/dados_vacinacao.zip',
+                    'dados/dados_imunizantes.csv']
+
+# respostas obtidas na execução atual (uma requisição por URL) e o que identifica o conteúdo de cada uma
+respostas_http = {}
+identidades_remotas = {}
+
+
+def requisicao_condicional(URL, arquivo_local):
+    if URL in respostas_http:
+        resposta = respostas_http[URL]
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    # só envia os validadores se a cópia local existir, pois é ela que responde a um 304
+    validadores = {}
+    if os.path.exists(arquivo_local):
+        with trava_cache_http:
+            if os.path.exists(ARQUIVO_CACHE_HTTP):
+                with open(ARQUIVO_CACHE_HTTP, 'r') as f:
+                    validadores = json.load(f).get(URL, {})
+
+    headers = {}
+    if 'etag' in validadores:
+        headers['If-None-Match'] = validadores['etag']
+    if 'last_modified' in validadores:
+        headers['If-Modified-Since'] = validadores['last_modified']
+
+    try:
+        req = requests.get(URL, headers=headers, timeout=TEMPO_LIMITE_REQUISICAO)
+
+        if req.status_code == 304:
+            req = None
+            identidades_remotas[URL] = json.dumps(validadores, sort_keys=True)
+        else:
+            req.raise_for_status()
+            validadores = _obtem_validadores(req)
+            if validadores:
+                identidades_remotas[URL] = json.dumps(validadores, sort_keys=True)
+            else:
+                identidades_remotas[URL] = hashlib.sha256(req.content).hexdigest()
+    except Exception as e:
+        respostas_http[URL] = e
+        identidades_remotas[URL] = 'indisponível'
+        raise
+
+    respostas_http[URL] = req
+    return req
+
+
+def _obtem_validadores(req):
+    validadores = {}
+    if 'ETag' in req.headers:
+        validadores['etag'] = req.headers['ETag']
+    if 'Last-Modified' in req.headers:
+        validadores['last_modified'] = req.headers['Last-Modified']
+
+    return validadores
+
+
+def registra_validadores(URL, req):
+    # chamada somente depois que a cópia local foi gravada com sucesso
+    validadores = _obtem_validadores(req)
+
+    with trava_cache_http:
+        cache = {}
+        if os.path.exists(ARQUIVO_CACHE_HTTP):
+            with open(ARQUIVO_CACHE_HTTP, 'r') as f:
+                cache = json.load(f)
+
+        if validadores:
+            cache[URL] = validadores
+        else:
+            cache.pop(URL, None)
+
+        with open(ARQUIVO_CACHE_HTTP, 'w') as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def verifica_fontes_remotas():
+    # as respostas ficam memorizadas e são reaproveitadas pelas funções de carga
+    def consulta(URL, arquivo_local):
+        try:
+            requisicao_condicional(URL, arquivo_local)
+        except Exception as e:
+            print(f'\tErro ao consultar {URL}: {e}')
+
+    with ThreadPoolExecutor(max_workers=len(FONTES_GITHUB)) as executor:
+        for URL, arquivo_local in FONTES_GITHUB.items():
+            executor.submit(consulta, URL, arquivo_local)
+
+    # os arquivos da campanha de vacinação não têm validadores: o conteúdo baixado entra na impressão digital
+    carrega_doses_aplicadas()
+    carrega_doses_recebidas()
+
+
+def calcula_impressao_digital():
+    impressao_digital = hashlib.sha256()
+    impressao_digital.update(data_processamento.strftime('%Y-%m-%d').encode())
+
+    with open(__file__, 'rb') as f:
+        impressao_digital.update(f.read())
+
+    for URL in sorted(identidades_remotas):
+        impressao_digital.update(f'{URL}={identidades_remotas[URL]}'.encode())
+
+    for arquivo in ARQUIVOS_ENTRADA:
+        impressao_digital.update(arquivo.encode())
+        if os.path.exists(arquivo):
+            with open(arquivo, 'rb') as f:
+                impressao_digital.update(hashlib.sha256(f.read()).digest())
+
+    return impressao_digital.hexdigest()
+
+
+def le_impressao_digital():
+    if not os.path.exists(ARQUIVO_IMPRESSAO_DIGITAL):
+        return None
+
+    with open(ARQUIVO_IMPRESSAO_DIGITAL, 'r') as f:
+        return f.read().strip()
+
+
+def grava_impressao_digital(impressao_digital):
+    with open(ARQUIVO_IMPRESSAO_DIGITAL, 'w') as f:
+        f.write(impressao_digital + '\n')
+
+
+# resultados das etapas de processamento, guardados entre execuções e identificados pelas assinaturas dos
+# dados de entrada; qualquer alteração no script invalida todas as etapas
+DIRETORIO_CACHE_ETAPAS = '.cache/etapas'
+
+# arquivos gravados pela etapa em execução neste processo (CSVs em dados/, gráficos em docs/graficos/): o
+# registro da etapa no cache guarda o hash de cada um
+arquivos_gravados = []
+
+# etapas cujo resultado também depende de data_processamento
+ETAPAS_DEPENDENTES_DA_DATA = {'pre_processamento_vacinacao', 'gera_resumo_diario', 'gera_resumo_semanal',
+                              'gera_resumo_vacinacao'}
+
+
+def calcula_assinatura(valor):
+    assinatura = hashlib.sha256()
+
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        try:
+            assinatura.update(pd.util.hash_pandas_object(valor, index=True).values.tobytes())
+            assinatura.update(repr(valor.dtypes.to_dict() if isinstance(valor, pd.DataFrame) else valor.dtype).encode())
+            return assinatura.hexdigest()
+        except TypeError:
+            # colunas com objetos que o pandas não sabe resumir
+            pass
+
+    assinatura.update(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+
+    return assinatura.hexdigest()
+
+
+def atualiza_dados(dados, assinaturas, novos_dados):
+    for nome, valor in novos_dados.items():
+        dados[nome] = valor
+        assinaturas[nome] = calcula_assinatura(valor)
+
+
+@lru_cache(maxsize=None)
+def calcula_versao_script():
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def calcula_chave_etapa(funcao, entradas, assinaturas):
+    chave = hashlib.sha256()
+    chave.update(calcula_versao_script().encode())
+    chave.update(funcao.__name__.encode())
+    chave.update(repr((processa_doencas, vacinacao, vacinacao_todos_municipios)).encode())
+
+    if funcao.__name__ in ETAPAS_DEPENDENTES_DA_DATA:
+        chave.update(data_processamento.strftime('%Y-%m-%d').encode())
+
+    for entrada in entradas:
+        chave.update(f'{entrada}={assinaturas[entrada]}'.encode())
+
+    return chave.hexdigest()
+
+
+def registra_arquivo(arquivo):
+    arquivos_gravados.append(arquivo)
+
+
+def calcula_hash_arquivo(arquivo):
+    if not os.path.exists(arquivo):
+        return None
+
+    with open(arquivo, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def le_cache_etapa(funcao, chave):
+    arquivo = f'{DIRETORIO_CACHE_ETAPAS}/{funcao.__name__}.pickle'
+
+    if not os.path.exists(arquivo):
+        return None
 
+    try:
+        with open(arquivo, 'rb') as f:
+            registro = pickle.load(f)
+    except Exception:
+        # arquivo corrompido ou gravado por outra versão do pandas: a etapa é refeita
+        return None
+
+    if registro['chave'] != chave:
+        return None
+
+    # os arquivos gravados pela etapa não fazem parte do cache (ex.: os do repositório, que podem ter vindo de
+    # outro commit): se algum deles não existir mais ou tiver sido alterado, a etapa é refeita
+    for arquivo, hash_arquivo in registro['arquivos'].items():
+        if calcula_hash_arquivo(arquivo) != hash_arquivo:
+            return None
+
+    return registro
+
+
+def grava_cache_etapa(funcao, chave, resultados, assinaturas, arquivos):
+    os.makedirs(DIRETORIO_CACHE_ETAPAS, exist_ok=True)
+    arquivo = f'{DIRETORIO_CACHE_ETAPAS}/{funcao.__name__}.pickle'
+    arquivos = {a: calcula_hash_arquivo(a) for a in arquivos}
+
+    with open(arquivo + '.tmp', 'wb') as f:
+        pickle.dump({'chave': chave, 'resultados': resultados, 'assinaturas': assinaturas, 'arquivos': arquivos}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(arquivo + '.tmp', arquivo)
+
+
+def executa_etapa(descricao, funcao, entradas, saidas, dados, assinaturas):
+    # a etapa recebe cópias dos dados de entrada, de modo que nunca altera o resultado de outra etapa
+    print(f'\t{descricao}...')
+    chave = calcula_chave_etapa(funcao, entradas, assinaturas)
+    registro = le_cache_etapa(funcao, chave)
+
+    if registro is not None:
+        print('\t\tSem alterações desde a última execução.')
+        dados.update(registro['resultados'])
+        assinaturas.update(registro['assinaturas'])
+        return
+
+    argumentos = [dados[e].copy() if isinstance(dados[e], (pd.DataFrame, pd.Series)) else dados[e] for e in entradas]
+    arquivos_gravados.clear()
+    resultado = funcao(*argumentos)
+
+    if len(saidas) == 1:
+        resultado = (resultado,)
+
+    resultados = dict(zip(saidas, resultado))
+    atualiza_dados(dados, assinaturas, resultados)
+    grava_cache_etapa(funcao, chave, resultados, {nome: assinaturas[nome] for nome in saidas}, arquivos_gravados)
+
+
+# cópias em Parquet dos CSVs locais, identificadas pelo sha256 do CSV e pelas opções de leitura; os CSVs
+# continuam sendo o formato publicado no repositório
+DIRETORIO_ARMAZENAMENTO_COLUNAR = '.cache/colunar'
+
+
+def le_csv_local(arquivo, leitor=pd.read_csv, **opcoes):
+    # com o pyarrow disponível, cada CSV é interpretado uma única vez: enquanto ele não mudar, as execuções
+    # seguintes leem a cópia colunar, que já guarda os tipos de cada coluna; se o CSV apenas ganhou linhas
+    # no final, só as linhas novas são interpretadas e acrescentadas à cópia colunar; com outro leitor, o que é
+    # guardado é o resultado dele (ex.: uma tabela já agregada)
+    if pyarrow is None:
+        return leitor(arquivo, **opcoes)
+
+    with open(arquivo, 'rb') as f:
+        conteudo = f.read()
+
+    assinatura = {'opcoes': repr((leitor.__qualname__, sorted(opcoes.items()))),
+                  'tamanho': len(conteudo),
+                  'sha256': hashlib.sha256(conteudo).hexdigest()}
+
+    arquivo_colunar = f'{DIRETORIO_ARMAZENAMENTO_COLUNAR}/{os.path.basename(arquivo)}.parquet'
+    arquivo_assinatura = arquivo_colunar + '.json'
+    dados = None
+
+    if os.path.exists(arquivo_colunar) and os.path.exists(arquivo_assinatura):
+        try:
+            with open(arquivo_assinatura, 'r') as f:
+                anterior = json.load(f)
+
+            if anterior == assinatura:
+                return pd.read_parquet(arquivo_colunar)
+
+            tamanho = anterior['tamanho']
+            acrescimo = anterior['opcoes'] == assinatura['opcoes'] and \
+                leitor is pd.read_csv and arquivo.endswith('.csv') and \
+                0 < tamanho < len(conteudo) and \
+                conteudo[tamanho - 1:tamanho] == b'\n' and \
+                hashlib.sha256(conteudo[:tamanho]).hexdigest() == anterior['sha256']
+
+            if acrescimo:
+                cabecalho = conteudo[:conteudo.index(b'\n') + 1]
+                anteriores = pd.read_parquet(arquivo_colunar)
+                novos = converte_tipos(pd.read_csv(BytesIO(cabecalho + conteudo[tamanho:]), **opcoes), anteriores)
+                dados = pd.concat([anteriores, novos], ignore_index='index_col' not in opcoes)
+        except Exception as e:
+            print(f'\tErro ao ler a cópia colunar de {arquivo}: lendo o CSV.\n\t{e}')
+            dados = None
+
+    if dados is None:
+        dados = leitor(arquivo, **opcoes)
+
+    try:
+        os.makedirs(DIRETORIO_ARMAZENAMENTO_COLUNAR, exist_ok=True)
+        dados.to_parquet(arquivo_colunar)
+
+        with open(arquivo_assinatura, 'w') as f:
+            json.dump(assinatura, f)
+    except Exception as e:
+        print(f'\tErro ao gravar a cópia colunar de {arquivo}.\n\t{e}')
+
+    return dados
+
+
+def converte_tipos(novos, anteriores):
+    # linhas interpretadas isoladamente podem ter tipos inferidos diferentes dos do arquivo completo
+    # (ex.: uma coluna sem valores ausentes vira inteiro); usa os tipos já conhecidos somente se eles comportarem
+    # os valores novos sem perdas (ex.: 1.5 não é truncado para 1); caso contrário a coluna nova é mantida e o
+    # pd.concat promove a coluna anterior (ex.: int64 para float64), como faria a leitura do arquivo completo
+    for coluna in novos.columns.intersection(anteriores.columns):
+        if novos[coluna].dtype != anteriores[coluna].dtype:
+            try:
+                if np.result_type(novos[coluna].dtype, anteriores[coluna].dtype) != anteriores[coluna].dtype:
+                    continue
+            except TypeError:
+                pass
+
+            try:
+                convertida = novos[coluna].astype(anteriores[coluna].dtype)
+            except (TypeError, ValueError):
+                continue
+
+            if convertida.astype(novos[coluna].dtype).equals(novos[coluna]):
+                novos[coluna] = convertida
+
+    return novos
+
+
+# tipos de cada conjunto de dados, aplicados ao carregá-lo: textos repetidos viram categorias (os filtros
+# comparam os códigos inteiros), contagens são guardadas em inteiros menores e as datas já chegam convertidas
+ESQUEMAS = {'dados_munic': {'categorias': ['nome_munic'],
+                            'inteiros': {'codigo_ibge': 'int32', 'casos': 'int32', 'casos_novos': 'int32',
+                                         'obitos': 'int32', 'obitos_novos': 'int32', 'pop': 'int32'},
+                            'datas': {'datahora': None}},
+            'isolamento': {'categorias': ['município', 'UF'],
+                           'inteiros': {'populacao': 'int32', 'isolamento': 'int8'},
+                           'datas': {'data': None}},
+            'internacoes': {'categorias': ['nome_drs'],
+                            'inteiros': {'pop': 'int32'},
+                            'datas': {'datahora': None}},
+            'leitos_estaduais': {'datas': {'data': '%d/%m/%Y'}},
+            'dados_vacinacao': {'categorias': ['municipio'],
+                                'inteiros': {'1a_dose': 'int32'},
+                                'datas': {'data': '%d/%m/%Y'}},
+            'doses_aplicadas': {'categorias': ['municipio', 'dose'],
+                                'inteiros': {'contagem': 'int32'}}}
+
+
+def aplica_esquema(dados, nome):
+    # colunas ausentes são ignoradas, pois as fontes alternativas nem sempre têm o mesmo formato
+    esquema = ESQUEMAS[nome]
+
+    for coluna, formato in esquema.get('datas', {}).items():
+        if coluna in dados.columns:
+            dados[coluna] = pd.to_datetime(dados[coluna], format=formato)
+
+    for coluna, tipo in esquema.get('inteiros', {}).items():
+        if coluna in dados.columns and dados[coluna].dtype.kind in 'iu':
+            convertida = dados[coluna].astype(tipo)
+
+            # só reduz a coluna se nenhum valor estourar o novo tipo
+            if (convertida == dados[coluna]).all():
+                dados[coluna] = convertida
+
+    for coluna in esquema.get('categorias', []):
+        if coluna in dados.columns:
+            dados[coluna] = dados[coluna].astype('category')
+
+    return dados
+
+
+def carrega_dados_vacinacao():
+    # arquivos da campanha de vacinação de data_processamento, usados no reprocessamento dia a dia
+    if vacinacao is True:
+        print('\tAtualizando dados da campanha de vacinação...')
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        doses_aplicadas = executor.submit(carrega_doses_aplicadas)
+        doses_recebidas = executor.submit(carrega_doses_recebidas)
+        atualizacao_imunizantes = executor.submit(carrega_atualizacao_imunizantes)
+
+        return doses_aplicadas.result(), doses_recebidas.result(), atualizacao_imunizantes.result()
+
+
+def carrega_dados_munic():
     try:
         print('\tAtualizando dados dos municípios...')
         URL = 'https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/dados_covid_sp.csv'
-        dados_munic = pd.read_csv(URL, sep=';', decimal=',')
-        dados_munic['letalidade'] = (dados_munic.obitos / dados_munic.casos) * 100
-        opcoes_zip = dict(method='zip', archive_name='dados_munic.csv')
-        dados_munic.to_csv('dados/dados_munic.zip', sep=';', decimal=',', index=False, compression=opcoes_zip)
+        req = requisicao_condicional(URL, 'dados/dados_munic.zip')
+
+        if req is None:
+            print('\tdados_covid_sp.csv não foi alterado: lendo arquivo local.')
+            dados_munic = le_csv_local('dados/dados_munic.zip', sep=';', decimal=',')
+        else:
+            dados_munic = pd.read_csv(BytesIO(req.content), sep=';', decimal=',')
+            dados_munic['letalidade'] = (dados_munic.obitos / dados_munic.casos) * 100
+            opcoes_zip = dict(method='zip', archive_name='dados_munic.csv')
+            dados_munic.to_csv('dados/dados_munic.zip', sep=';', decimal=',', index=False, compression=opcoes_zip)
+            registra_validadores(URL, req)
     except Exception as e:
         traceback.print_exception(type(e), e, e.__traceback__)
         print('\tErro ao buscar dados_covid_sp.csv do GitHub: lendo arquivo local.\n')
-        dados_munic = pd.read_csv('dados/dados_munic.zip', sep=';', decimal=',')
+        dados_munic = le_csv_local('dados/dados_munic.zip', sep=';', decimal=',')
 
+    return aplica_esquema(dados_munic, 'dados_munic')
+
+
+def carrega_dados_estado_sp():
     try:
         print('\tAtualizando dados estaduais...')
         URL = 'https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/sp.csv'
-        dados_estado = pd.read_csv(URL, sep=';')
-        dados_estado.to_csv('dados/dados_estado_sp.csv', sep=';')
+        req = requisicao_condicional(URL, 'dados/dados_estado_sp.csv')
+
+        if req is None:
+            print('\tsp.csv não foi alterado: lendo arquivo local.')
+            dados_estado = le_csv_local('dados/dados_estado_sp.csv', sep=';', index_col=0)
+        else:
+            # a cópia local é gravada em UTF-8 e com ponto decimal, e é lida de volta com as mesmas opções
+            dados_estado = pd.read_csv(BytesIO(req.content), sep=';')
+            dados_estado.to_csv('dados/dados_estado_sp.csv', sep=';')
+            registra_validadores(URL, req)
     except Exception as e:
         traceback.print_exception(type(e), e, e.__traceback__)
         print('\tErro ao buscar dados_estado_sp.csv do GitHub: lendo arquivo local.\n')
-        dados_estado = pd.read_csv('dados/dados_estado_sp.csv', sep=';', decimal=',', encoding='latin-1', index_col=0)
+        dados_estado = le_csv_local('dados/dados_estado_sp.csv', sep=';', index_col=0)
 
+    return dados_estado
+
+
+def carrega_isolamento():
     try:
         print('\tCarregando dados de isolamento social...')
-        isolamento = pd.read_csv('dados/isolamento_social.csv', sep=',')
+        return aplica_esquema(le_csv_local('dados/isolamento_social.csv', sep=','), 'isolamento')
     except Exception as e:
         print(f'\tErro ao buscar isolamento_social.csv\n\t{e}')
 
+
+def carrega_internacoes():
+    hoje = data_processamento
+    ano = hoje.strftime('%Y')
+    mes = hoje.strftime('%m')
+
     try:
         print('\tAtualizando dados de internações...')
         URL = ('https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/plano_sp_leitos_internacoes.csv')
-        internacoes = pd.read_csv(URL, sep=';', decimal=',', thousands='.')
-        internacoes.to_csv('dados/internacoes.csv', sep=';', decimal=',')
+        req = requisicao_condicional(URL, 'dados/internacoes.csv')
+
+        if req is None:
+            print('\tplano_sp_leitos_internacoes.csv não foi alterado: lendo arquivo local.')
+            internacoes = le_csv_local('dados/internacoes.csv', sep=';', decimal=',', thousands='.', index_col=0)
+        else:
+            internacoes = acrescenta_internacoes(req.content)
+            registra_validadores(URL, req)
     except Exception as e:
         try:
             print(f'\tErro ao buscar internacoes.csv do GitHub: lendo arquivo da Seade.\n\t{e}')
             URL = (f'http://www.seade.gov.br/wp-content/uploads/{ano}/{mes}/Leitos-e-Internacoes.csv')
             internacoes = pd.read_csv(URL, sep=';', encoding='latin-1', decimal=',', thousands='.', engine='python',
                                       skipfooter=2)
+            # o arquivo da Seade não é gravado localmente: as ocupações são recalculadas para todas as datas
+            registra_revisao_internacoes(None, internacoes)
         except Exception as e:
             print(f'\tErro ao buscar internacoes.csv da Seade: lendo arquivo local.\n\t{e}')
-            internacoes = pd.read_csv('dados/internacoes.csv', sep=';', decimal=',', thousands='.', index_col=0)
+            internacoes = le_csv_local('dados/internacoes.csv', sep=';', decimal=',', thousands='.', index_col=0)
+
+    return aplica_esquema(internacoes, 'internacoes')
+
+
+# hash das linhas da Seade já gravadas em dados/internacoes.csv e a primeira data revisada na origem, que fica
+# registrada até que pre_processamento_internacoes recalcule as ocupações a partir dela
+ARQUIVO_ORIGEM_INTERNACOES = f'{DIRETORIO_ARMAZENAMENTO_COLUNAR}/internacoes_origem.json'
+
+
+def le_origem_internacoes():
+    if not os.path.exists(ARQUIVO_ORIGEM_INTERNACOES):
+        return {}
+
+    with open(ARQUIVO_ORIGEM_INTERNACOES, 'r') as f:
+        return json.load(f)
+
+
+def grava_origem_internacoes(**alteracoes):
+    origem = le_origem_internacoes()
+    origem.update(alteracoes)
+
+    os.makedirs(DIRETORIO_ARMAZENAMENTO_COLUNAR, exist_ok=True)
+
+    with open(ARQUIVO_ORIGEM_INTERNACOES, 'w') as f:
+        json.dump(origem, f)
+
+
+def registra_revisao_internacoes(locais, internacoes):
+    # primeira data (1ª coluna) com linhas diferentes entre a cópia local e o arquivo novo; sem cópia local
+    # comparável, todas as datas são consideradas revisadas
+    coluna = internacoes.columns[0]
+
+    if locais is None or list(locais.columns) != list(internacoes.columns):
+        alteradas = internacoes[coluna]
+    else:
+        internacoes = converte_tipos(internacoes.copy(), locais)
+        hash_locais = pd.util.hash_pandas_object(locais, index=False)
+        hash_novos = pd.util.hash_pandas_object(internacoes, index=False)
+        alteradas = pd.concat([internacoes.loc[~hash_novos.isin(hash_locais).values, coluna],
+                               locais.loc[~hash_locais.isin(hash_novos).values, coluna]])
+
+    if alteradas.empty:
+        return
+
+    revisado_desde = str(alteradas.min())
+    anterior = le_origem_internacoes().get('revisado_desde')
+
+    if anterior is not None:
+        revisado_desde = min(revisado_desde, anterior)
+
+    print(f'\t\tInternações revisadas na origem a partir de {revisado_desde}.')
+    grava_origem_internacoes(revisado_desde=revisado_desde)
+
+
+def _hash_linhas(linhas):
+    return hashlib.sha256('\n'.join(linhas).encode()).hexdigest()
+
+
+def acrescenta_internacoes(conteudo):
+    # o arquivo da Seade só ganha novas datas no final: apenas as linhas posteriores à última data gravada
+    # são interpretadas e acrescentadas ao arquivo local; se o hash das linhas anteriores não bater com o das
+    # linhas gravadas (arquivo revisado na origem), o arquivo local é refeito por completo
+    opcoes = dict(sep=';', decimal=',', thousands='.')
+    linhas = [linha for linha in conteudo.decode('utf-8-sig').splitlines() if linha.strip()]
+    cabecalho = linhas[0].split(';')
+
+    locais = None
+    if os.path.exists('dados/internacoes.csv'):
+        locais = le_csv_local('dados/internacoes.csv', index_col=0, **opcoes)
+
+    if locais is not None and 'datahora' in cabecalho and list(locais.columns) == cabecalho:
+        posicao = cabecalho.index('datahora')
+        ultima_data = str(locais.datahora.max())
+        anteriores, novas = [linhas[0]], []
+
+        for linha in linhas[1:]:
+            (novas if linha.split(';')[posicao] > ultima_data else anteriores).append(linha)
+
+        if len(anteriores) - 1 == len(locais) and _hash_linhas(anteriores) == le_origem_internacoes().get('sha256'):
+            print(f'\t\t{len(novas)} novas linhas de internações após {ultima_data}.')
+
+            if not novas:
+                return locais
+
+            novos = pd.read_csv(StringIO('\n'.join([linhas[0]] + novas)), **opcoes)
+            novos = converte_tipos(novos, locais)
+            novos.index = range(len(locais), len(locais) + len(novos))
+            novos.to_csv('dados/internacoes.csv', sep=';', decimal=',', mode='a', header=False)
+            grava_origem_internacoes(sha256=_hash_linhas(linhas))
+
+            return pd.concat([locais, novos])
+
+    internacoes = pd.read_csv(BytesIO(conteudo), **opcoes)
+
+    # a revisão é registrada antes de o arquivo local ser refeito, para não se perder se a execução falhar
+    registra_revisao_internacoes(locais, internacoes)
+    internacoes.to_csv('dados/internacoes.csv', sep=';', decimal=',')
+    grava_origem_internacoes(sha256=_hash_linhas(linhas))
+
+    return internacoes
+
+
+def carrega_doencas():
+    hoje = data_processamento
+    ano = hoje.strftime('%Y')
+    mes = hoje.strftime('%m')
+
+    # o nome do leitor faz parte da assinatura da cópia colunar: cópias da tabela antes da codificação das
+    # doenças não são reaproveitadas
+    def le_doencas_codificadas(arquivo, **opcoes):
+        return agrega_doencas(arquivo, **opcoes)[0]
 
     try:
         print('\tAtualizando dados de doenças preexistentes...')
         URL = ('https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/casos_obitos_doencas_preexistentes.csv.zip')
-        doencas = pd.read_csv(URL, sep=';')
-        if len(doencas.asma.unique()) == 3:
-            opcoes_zip = dict(method='zip', archive_name='doencas_preexistentes.csv')
-            doencas.to_csv('dados/doencas_preexistentes.zip', sep=';', compression=opcoes_zip)
+        req = requisicao_condicional(URL, 'dados/doencas_preexistentes.zip')
+
+        if req is None:
+            print('\tcasos_obitos_doencas_preexistentes.csv não foi alterado: lendo arquivo local.')
+            doencas = le_csv_local('dados/doencas_preexistentes.zip', leitor=le_doencas_codificadas, sep=';')
         else:
-            global processa_doencas
-            processa_doencas = False
-            raise Exception('O arquivo de doeças preexistentes não possui registros SIM/NÃO/IGNORADO para todas as doenças.')
+            doencas, valores_asma = agrega_doencas(BytesIO(req.content), sep=';', compression='zip')
+
+            if valores_asma == 3:
+                # o arquivo compactado é gravado como veio, sem ser reescrito a partir dos dados
+                with open('dados/doencas_preexistentes.zip', 'wb') as f:
+                    f.write(req.content)
+                registra_validadores(URL, req)
+            else:
+                global processa_doencas
+                processa_doencas = False
+                raise Exception('O arquivo de doeças preexistentes não possui registros SIM/NÃO/IGNORADO para todas as doenças.')
     except Exception as e:
         try:
             print(f'\tErro ao buscar doencas_preexistentes.csv do GitHub: lendo arquivo local.\n\t{e}')
-            doencas = pd.read_csv('dados/doencas_preexistentes.zip', sep=';', index_col=0)
+            doencas = le_csv_local('dados/doencas_preexistentes.zip', leitor=le_doencas_codificadas, sep=';')
         except Exception as e:
             print(f'\tErro ao buscar doencas_preexistentes.csv localmente: lendo arquivo da Seade.\n\t{e}')
             URL = f'http://www.seade.gov.br/wp-content/uploads/{ano}/{mes}/casos_obitos_doencas_preexistentes.csv'
-            doencas = pd.read_csv(URL, sep=';', encoding='latin-1')
+            doencas = agrega_doencas(URL, sep=';', encoding='latin-1')[0]
+
+    return doencas
+
+
+COLUNAS_DOENCAS = ['municipio', 'codigo_ibge', 'idade', 'sexo', 'covid19', 'data_inicio_sintomas', 'obito', 'asma',
+                   'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica', 'doenca_neurologica',
+                   'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
+                   'sindrome_de_down']
+
+DOENCAS = ['asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica', 'doenca_neurologica',
+           'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera', 'sindrome_de_down']
+
+CHAVES_DOENCAS = ['obito', 'covid19', 'idade', 'sexo'] + DOENCAS
+
+# cada doença ocupa 2 bits do código de uma linha (qualquer outro valor no arquivo vira ESTADO_DOENCA_OUTRO)
+ESTADOS_DOENCA = {'NÃO': 0, 'SIM': 1, 'IGNORADO': 2}
+ESTADO_DOENCA_OUTRO = 3
+BITS_ESTADO_DOENCA = 2
+
+CHAVES_DOENCAS_CODIFICADAS = ['obito', 'covid19', 'idade', 'sexo', 'codigo']
+
+SEXOS_DOENCAS = ['FEMININO', 'MASCULINO']
+
+# linhas lidas por vez do arquivo de doenças preexistentes
+TAMANHO_BLOCO_DOENCAS = 250000
+
+
+def agrega_doencas(origem, **opcoes):
+    # o arquivo tem uma linha por caso (milhões de linhas): ele é lido em blocos e cada bloco é somado à tabela
+    # de contagens, de modo que a memória usada é limitada pelo tamanho da tabela agregada, e não do arquivo;
+    # também devolve quantos valores distintos (incluindo o ausente) a coluna asma possui no arquivo todo
+    agregado = None
+    valores_asma = set()
+    asma_ausente = False
+
+    # as colunas numéricas das chaves são somadas como float e só voltam a ser inteiras se forem inteiras em
+    # todos os blocos, como aconteceria com a leitura do arquivo inteiro
+    inteiros = {'idade': True, 'obito': True}
+
+    for bloco in pd.read_csv(origem, chunksize=TAMANHO_BLOCO_DOENCAS, **opcoes):
+        # cópias locais antigas foram gravadas com o índice
+        if bloco.columns[0].startswith('Unnamed'):
+            bloco = bloco.iloc[:, 1:]
+
+        bloco.columns = COLUNAS_DOENCAS
+
+        valores_asma.update(bloco.asma.dropna().unique())
+        asma_ausente = asma_ausente or bloco.asma.isna().any()
+
+        for coluna in inteiros:
+            inteiros[coluna] = inteiros[coluna] and bloco[coluna].dtype.kind in 'iu'
+
+            if bloco[coluna].dtype.kind in 'iuf':
+                bloco[coluna] = bloco[coluna].astype('float64')
+
+        # as 13 doenças de cada linha viram um único código inteiro, e a contagem é feita por código
+        bloco = bloco.dropna(subset=CHAVES_DOENCAS)
+        codigo = np.zeros(len(bloco), dtype='int64')
+
+        for i, d in enumerate(DOENCAS):
+            estado = bloco[d].map(ESTADOS_DOENCA).fillna(ESTADO_DOENCA_OUTRO).to_numpy(dtype='int64')
+            codigo |= estado << (BITS_ESTADO_DOENCA * i)
+
+        parcial = bloco.assign(codigo=codigo).groupby(CHAVES_DOENCAS_CODIFICADAS).size()
+
+        if agregado is None:
+            agregado = parcial
+        else:
+            agregado = pd.concat([agregado, parcial]).groupby(level=CHAVES_DOENCAS_CODIFICADAS).sum()
+
+    agregado = agregado.to_frame('casos')
 
+    for coluna, inteiro in inteiros.items():
+        if inteiro:
+            nivel = agregado.index.names.index(coluna)
+            agregado.index = agregado.index.set_levels(agregado.index.levels[nivel].astype('int64'), level=nivel)
+
+    return agregado, len(valores_asma) + asma_ausente
+
+
+def monta_cubo_doencas(doencas):
+    # cubo denso com os casos confirmados por (óbito, sexo, idade, código das doenças), onde óbito é 0 ou 1 e
+    # sexo segue SEXOS_DOENCAS; as idades seguem a ordem em que aparecem na tabela agregada
+    idades = list(doencas.index.get_level_values('idade').unique())
+    confirmados = doencas.xs('CONFIRMADO', level='covid19').casos
+
+    codigos = np.unique(confirmados.index.get_level_values('codigo'))
+    sexo = pd.Index(SEXOS_DOENCAS).get_indexer(confirmados.index.get_level_values('sexo'))
+    obito = (confirmados.index.get_level_values('obito') == 1).astype('int64')
+    idade = pd.Index(idades).get_indexer(confirmados.index.get_level_values('idade'))
+    codigo = np.searchsorted(codigos, confirmados.index.get_level_values('codigo'))
+
+    validos = sexo >= 0
+    cubo = np.zeros((2, len(SEXOS_DOENCAS), len(idades), len(codigos)), dtype='int64')
+    np.add.at(cubo, (obito[validos], sexo[validos], idade[validos], codigo[validos]),
+              confirmados.to_numpy()[validos])
+
+    return idades, codigos, cubo
+
+
+def decodifica_doencas(codigos):
+    # estado (ESTADOS_DOENCA) de cada doença em cada código: matriz (código, doença)
+    deslocamentos = BITS_ESTADO_DOENCA * np.arange(len(DOENCAS))
+    return (codigos[:, None] >> deslocamentos) & ((1 << BITS_ESTADO_DOENCA) - 1)
+
+
+def distribui_por_doenca(cubo, codigos):
+    # troca a última dimensão do cubo (código) por (doença, estado), com os estados na ordem de ESTADOS_DOENCA
+    # seguidos de ESTADO_DOENCA_OUTRO
+    estados = decodifica_doencas(codigos)
+    indicadores = (estados[:, :, None] == np.arange(1 << BITS_ESTADO_DOENCA)).astype('int64')
+    return np.einsum('...c,cde->...de', cubo, indicadores)
+
+
+def conta_doencas(cubo, codigos, **estados):
+    # soma os códigos em que cada doença informada tem o estado pedido, ex.: conta_doencas(cubo, codigos,
+    # asma='SIM', diabetes='SIM') para a combinação das duas doenças, sem nova leitura do arquivo
+    selecionados = np.ones(len(codigos), dtype=bool)
+    decodificados = decodifica_doencas(codigos)
+
+    for d, estado in estados.items():
+        selecionados &= decodificados[:, DOENCAS.index(d)] == ESTADOS_DOENCA[estado]
+
+    return cubo[..., selecionados].sum(axis=-1)
+
+
+def carrega_dados_raciais():
     try:
         print('\tAtualizando dados de casos/óbitos por raça e cor...')
         URL = ('https://raw.githubusercontent.com/seade-R/dados-covid-sp/master/data/casos_obitos_raca_cor.csv.zip')
-        dados_raciais = pd.read_csv(URL, sep=';')
-        opcoes_zip = dict(method='zip', archive_name='dados_raciais.csv')
-        dados_raciais.to_csv('dados/dados_raciais.zip', sep=';', compression=opcoes_zip)
+        req = requisicao_condicional(URL, 'dados/dados_raciais.zip')
+
+        if req is None:
+            print('\tcasos_obitos_raca_cor.csv não foi alterado: lendo arquivo local.')
+            dados_raciais = le_csv_local('dados/dados_raciais.zip', sep=';', index_col=0)
+        else:
+            dados_raciais = pd.read_csv(BytesIO(req.content), sep=';', compression='zip')
+            opcoes_zip = dict(method='zip', archive_name='dados_raciais.csv')
+            dados_raciais.to_csv('dados/dados_raciais.zip', sep=';', compression=opcoes_zip)
+            registra_validadores(URL, req)
     except Exception as e:
         print(f'\tErro ao buscar dados_raciais.csv do GitHub: lendo arquivo local.\n\t{e}')
-        dados_raciais = pd.read_csv('dados/dados_raciais.zip', sep=';', index_col=0)
+        dados_raciais = le_csv_local('dados/dados_raciais.zip', sep=';', index_col=0)
 
-    global vacinacao
+    return dados_raciais
 
-    if vacinacao is True:
-        print('\tAtualizando dados da campanha de vacinação...')
 
-        headers = {'User-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                                 'AppleWebKit/537.36 (KHTML, like Gecko) '
-                                 'Chrome/88.0.4324.182 '
-                                 'Safari/537.36 '
-                                 'Edg/88.0.705.74'}
+def _busca_csv_vacinometro(URL):
+    headers = {'User-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                             'AppleWebKit/537.36 (KHTML, like Gecko) '
+                             'Chrome/88.0.4324.182 '
+                             'Safari/537.36 '
+                             'Edg/88.0.705.74'}
 
+    if URL in respostas_http:
+        req = respostas_http[URL]
+        if isinstance(req, Exception):
+            raise req
+    else:
         try:
-            print('\t\tDoses aplicadas por município...')
-            URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_vacinometro.csv'
-            req = requests.get(URL, headers=headers, stream=True)
-            req.encoding = req.apparent_encoding
-            doses_aplicadas = pd.read_csv(StringIO(req.text), sep=';', encoding=req.encoding)
-            if doses_aplicadas.columns.size == 1:
-                raise Exception('Arquivo com problemas. Tentando buscar arquivo com final -1.csv...')
+            req = requests.get(URL, headers=headers, stream=True, timeout=TEMPO_LIMITE_REQUISICAO)
+            identidades_remotas[URL] = hashlib.sha256(req.content).hexdigest()
         except Exception as e:
-            try:
-                print('\t\tDoses recebidas por cada município...')
-                URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_vacinometro-1.csv'
-                req = requests.get(URL, headers=headers, stream=True)
-                req.encoding = req.apparent_encoding
-                doses_aplicadas = pd.read_csv(StringIO(req.text), sep=';', encoding=req.encoding)
-            except Exception as e:
-                try:
-                    print('\t\tDoses aplicadas por município... .csv.csv')
-                    URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_vacinometro.csv.csv'
-                    req = requests.get(URL, headers=headers, stream=True)
-                    req.encoding = req.apparent_encoding
-                    doses_aplicadas = pd.read_csv(StringIO(req.text), sep=';', encoding=req.encoding)
-                except Exception as e:
-                    print(f'\t\tErro ao buscar {data}_vacinometro.csv da Seade: {e}')
-                    doses_aplicadas = None
+            respostas_http[URL] = e
+            identidades_remotas[URL] = 'indisponível'
+            raise
+
+        respostas_http[URL] = req
+
+    req.encoding = req.apparent_encoding
+    return pd.read_csv(StringIO(req.text), sep=';', encoding=req.encoding)
 
+
+def carrega_doses_aplicadas():
+    if vacinacao is not True:
+        return None
+
+    hoje = data_processamento
+    ano = hoje.strftime('%Y')
+    mes = hoje.strftime('%m')
+    data = hoje.strftime('%Y%m%d')
+
+    try:
+        print('\t\tDoses aplicadas por município...')
+        URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_vacinometro.csv'
+        doses_aplicadas = _busca_csv_vacinometro(URL)
+        if doses_aplicadas.columns.size == 1:
+            raise Exception('Arquivo com problemas. Tentando buscar arquivo com final -1.csv...')
+    except Exception as e:
         try:
             print('\t\tDoses recebidas por cada município...')
-            URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_painel_distribuicao_doses.csv'
-            req = requests.get(URL, headers=headers, stream=True)
-            req.encoding = req.apparent_encoding
-            doses_recebidas = pd.read_csv(StringIO(req.text), sep=';', encoding=req.encoding)
-            if doses_recebidas.columns.size == 1:
-                raise Exception('Arquivo com problemas. Tentando buscar arquivo com final -1.csv...')
+            URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_vacinometro-1.csv'
+            doses_aplicadas = _busca_csv_vacinometro(URL)
         except Exception as e:
             try:
-                print('\t\tDoses recebidas por cada município...')
-                URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_painel_distribuicao_doses-1.csv'
-                req = requests.get(URL, headers=headers, stream=True)
-                req.encoding = req.apparent_encoding
-                doses_recebidas = pd.read_csv(StringIO(req.text), sep=';', encoding=req.encoding)
+                print('\t\tDoses aplicadas por município... .csv.csv')
+                URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_vacinometro.csv.csv'
+                doses_aplicadas = _busca_csv_vacinometro(URL)
             except Exception as e:
-                try:
-                    print('\t\tDoses recebidas por cada município... .csv.csv')
-                    URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_painel_distribuicao_doses.csv.csv'
-                    req = requests.get(URL, headers=headers, stream=True)
-                    req.encoding = req.apparent_encoding
-                    doses_recebidas = pd.read_csv(StringIO(req.text), sep=';', encoding=req.encoding)
-                except Exception as e:
-                    print(f'\t\tErro ao buscar {data}_painel_distribuicao_doses.csv da Seade: {e}')
-                    doses_recebidas = None
+                print(f'\t\tErro ao buscar {data}_vacinometro.csv da Seade: {e}')
+                doses_aplicadas = None
+
+    return doses_aplicadas
+
+
+def carrega_doses_recebidas():
+    if vacinacao is not True:
+        return None
+
+    hoje = data_processamento
+    ano = hoje.strftime('%Y')
+    mes = hoje.strftime('%m')
+    data = hoje.strftime('%Y%m%d')
 
+    try:
+        print('\t\tDoses recebidas por cada município...')
+        URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_painel_distribuicao_doses.csv'
+        doses_recebidas = _busca_csv_vacinometro(URL)
+        if doses_recebidas.columns.size == 1:
+            raise Exception('Arquivo com problemas. Tentando buscar arquivo com final -1.csv...')
+    except Exception as e:
         try:
-            raise Exception('O scrapping do Tableau não funciona mais...')
-            print('\t\tAtualizando doses aplicadas por vacina...')
-            url = 'https://www2.simi.sp.gov.br/views/PaineldeEstatsticasGerais_14_09_2021_16316423974680/PaineldeEstatsticasGerais'
-            scraper = TableauScraper()
-            scraper.loads(url)
-            sheet = scraper.getWorkbook().getWorksheet('donuts imunibiológico')
-            atualizacao_imunizantes = sheet.data.copy()
-            atualizacao_imunizantes['data'] = data_processamento
-            atualizacao_imunizantes = atualizacao_imunizantes[['data', 'Imunobiologico -alias', 'SUM(Qtde)-alias']]
-            atualizacao_imunizantes.columns = ['data', 'vacina', 'aplicadas']
-            atualizacao_imunizantes = atualizacao_imunizantes.replace('ASTRAZENECA/OXFORD/FIOCRUZ', 'ASTRAZENECA | OXFORD', False)
-            atualizacao_imunizantes = atualizacao_imunizantes.replace('CORONAVAC', 'CORONAVAC | BUTANTAN', False)
-            atualizacao_imunizantes = atualizacao_imunizantes.replace('JANSSEN', 'JANSSEN | JOHNSON & JOHNSON', False)
-            atualizacao_imunizantes = atualizacao_imunizantes.replace('PFIZER', 'PFIZER | BIONTECH', False)
-            atualizacao_imunizantes.sort_values(by='vacina', inplace=True)
+            print('\t\tDoses recebidas por cada município...')
+            URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_painel_distribuicao_doses-1.csv'
+            doses_recebidas = _busca_csv_vacinometro(URL)
         except Exception as e:
-            print(f'\t\tErro ao buscar dados de vacinas do Tableau: {e}')
-            traceback.print_exception(type(e), e, e.__traceback__)
-            atualizacao_imunizantes = None
-    else:
-        doses_aplicadas = None
-        doses_recebidas = None
+            try:
+                print('\t\tDoses recebidas por cada município... .csv.csv')
+                URL = f'https://www.saopaulo.sp.gov.br/wp-content/uploads/{ano}/{mes}/{data}_painel_distribuicao_doses.csv.csv'
+                doses_recebidas = _busca_csv_vacinometro(URL)
+            except Exception as e:
+                print(f'\t\tErro ao buscar {data}_painel_distribuicao_doses.csv da Seade: {e}')
+                doses_recebidas = None
+
+    return doses_recebidas
+
+
+def carrega_atualizacao_imunizantes():
+    if vacinacao is not True:
+        return None
+
+    try:
+        raise Exception('O scrapping do Tableau não funciona mais...')
+        print('\t\tAtualizando doses aplicadas por vacina...')
+        url = 'https://www2.simi.sp.gov.br/views/PaineldeEstatsticasGerais_14_09_2021_16316423974680/PaineldeEstatsticasGerais'
+        scraper = TableauScraper()
+        scraper.loads(url)
+        sheet = scraper.getWorkbook().getWorksheet('donuts imunibiológico')
+        atualizacao_imunizantes = sheet.data.copy()
+        atualizacao_imunizantes['data'] = data_processamento
+        atualizacao_imunizantes = atualizacao_imunizantes[['data', 'Imunobiologico -alias', 'SUM(Qtde)-alias']]
+        atualizacao_imunizantes.columns = ['data', 'vacina', 'aplicadas']
+        atualizacao_imunizantes = atualizacao_imunizantes.replace('ASTRAZENECA/OXFORD/FIOCRUZ', 'ASTRAZENECA | OXFORD', False)
+        atualizacao_imunizantes = atualizacao_imunizantes.replace('CORONAVAC', 'CORONAVAC | BUTANTAN', False)
+        atualizacao_imunizantes = atualizacao_imunizantes.replace('JANSSEN', 'JANSSEN | JOHNSON & JOHNSON', False)
+        atualizacao_imunizantes = atualizacao_imunizantes.replace('PFIZER', 'PFIZER | BIONTECH', False)
+        atualizacao_imunizantes.sort_values(by='vacina', inplace=True)
+    except Exception as e:
+        print(f'\t\tErro ao buscar dados de vacinas do Tableau: {e}')
+        traceback.print_exception(type(e), e, e.__traceback__)
         atualizacao_imunizantes = None
 
-    leitos_estaduais = pd.read_csv('dados/leitos_estaduais.csv', index_col=0)
-    dados_vacinacao = pd.read_csv('dados/dados_vacinacao.zip')
-    dados_imunizantes = pd.read_csv('dados/dados_imunizantes.csv')
+    return atualizacao_imunizantes
 
-    return dados_munic, dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, doses_aplicadas, doses_recebidas, dados_imunizantes, atualizacao_imunizantes
 
+def pre_processamento(dados, assinaturas):
+    # cada etapa declara os dados que lê e os que produz, e só é refeita se algum dos dados lidos mudou
+    etapas = [('Dados municipais', pre_processamento_cidade,
+               ('dados_munic', 'hospitais_campanha', 'leitos_municipais', 'leitos_municipais_privados', 'leitos_municipais_total'),
+               ('dados_cidade', 'dados_munic', 'hospitais_campanha', 'leitos_municipais', 'leitos_municipais_privados', 'leitos_municipais_total')),
+              ('Casos e óbitos estaduais', pre_processamento_casos_estado, ('dados_estado',), ('dados_estado',)),
+              ('Isolamento social', pre_processamento_isolamento, ('isolamento',), ('isolamento',)),
+              ('Internações', pre_processamento_internacoes, ('leitos_estaduais', 'internacoes', 'internacoes_revisado_desde'), ('leitos_estaduais', 'internacoes')),
+              ('Raça/cor', pre_processamento_raciais, ('dados_raciais',), ('dados_raciais',))]
 
-def pre_processamento(hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total, dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, doses_aplicadas, doses_recebidas, dados_munic, dados_imunizantes, atualizacao_imunizantes):
-    print('\tDados municipais...')
-    dados_cidade, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total = pre_processamento_cidade(dados_munic, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total)
-    print('\tDados estaduais...')
-    dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, dados_munic, dados_imunizantes = pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, doses_aplicadas, doses_recebidas, dados_munic, dados_imunizantes, atualizacao_imunizantes)
+    # a primeira data revisada na origem (registrada ao carregar as internações) é uma entrada como as outras,
+    # para que faça parte da chave da etapa; o registro só é apagado depois que a etapa foi executada
+    revisado_desde = le_origem_internacoes().get('revisado_desde')
+    atualiza_dados(dados, assinaturas, {'internacoes_revisado_desde': revisado_desde})
 
-    return dados_cidade, dados_munic, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total, dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, dados_imunizantes
+    for descricao, funcao, entradas, saidas in etapas:
+        executa_etapa(descricao, funcao, entradas, saidas, dados, assinaturas)
+
+    if revisado_desde is not None:
+        grava_origem_internacoes(revisado_desde=None)
 
 
 def pre_processamento_cidade(dados_munic, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total):
-    dados_cidade = dados_munic.loc[dados_munic.nome_munic == 'São Paulo', ['datahora', 'casos', 'casos_novos', 'obitos', 'obitos_novos', 'letalidade']]
+    calcula_series_diarias(dados_munic, 'datahora', 'casos', 'obitos', coluna_grupo='codigo_ibge')
+
+    dados_cidade = dados_munic.loc[dados_munic.nome_munic == 'São Paulo', ['datahora', 'casos', 'casos_dia', 'obitos', 'obitos_dia', 'letalidade']]
     dados_cidade.columns = ['data', 'confirmados', 'casos_dia', 'óbitos', 'óbitos_dia', 'letalidade']
     dados_cidade['data'] = pd.to_datetime(dados_cidade.data)
-    dados_cidade['dia'] = dados_cidade.data.apply(lambda d: d.strftime('%d %b %y'))
+    dados_cidade['dia'] = formata_datas(dados_cidade.data)
 
     hospitais_campanha['data'] = pd.to_datetime(hospitais_campanha.data, format='%d/%m/%Y')
-    hospitais_campanha['dia'] = hospitais_campanha.data.apply(lambda d: d.strftime('%d %b %y'))
+    hospitais_campanha['dia'] = formata_datas(hospitais_campanha.data)
+
+    leitos_municipais['data'] = pd.to_datetime(leitos_municipais.data, format='%d/%m/%Y')
+    leitos_municipais['dia'] = formata_datas(leitos_municipais.data)
+
+    leitos_municipais_privados['data'] = pd.to_datetime(leitos_municipais_privados.data, format='%d/%m/%Y')
+    leitos_municipais_privados['dia'] = formata_datas(leitos_municipais_privados.data)
+
+    leitos_municipais_total['data'] = pd.to_datetime(leitos_municipais_total.data, format='%d/%m/%Y')
+    leitos_municipais_total['dia'] = formata_datas(leitos_municipais_total.data)
+
+    dados_munic['datahora'] = pd.to_datetime(dados_munic.datahora)
+
+    return dados_cidade, dados_munic, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total
+
+
+def calcula_series_diarias(dados, coluna_data, coluna_casos, coluna_obitos, coluna_grupo=None):
+    # casos e óbitos do dia são a diferença entre totais acumulados consecutivos (por município, se houver
+    # coluna_grupo); a primeira data de cada série recebe o próprio total
+    totais = dados[[coluna_casos, coluna_obitos]].loc[dados[coluna_data].sort_values(kind='mergesort').index]
 
-    leitos_municipais['data'] = pd.to_datetime(leitos_municipais.data, format='%d/%m/%Y')
-    leitos_municipais['dia'] = leitos_municipais.data.apply(lambda d: d.strftime('%d %b %y'))
+    if coluna_grupo is None:
+        diferencas = totais.diff()
+    else:
+        diferencas = totais.groupby(dados[coluna_grupo]).diff()
 
-    leitos_municipais_privados['data'] = pd.to_datetime(leitos_municipais_privados.data, format='%d/%m/%Y')
-    leitos_municipais_privados['dia'] = leitos_municipais_privados.data.apply(lambda d: d.strftime('%d %b %y'))
+    diferencas = diferencas.fillna(totais)
+    dados['casos_dia'] = diferencas[coluna_casos].astype(dados[coluna_casos].dtype)
+    dados['obitos_dia'] = diferencas[coluna_obitos].astype(dados[coluna_obitos].dtype)
 
-    leitos_municipais_total['data'] = pd.to_datetime(leitos_municipais_total.data, format='%d/%m/%Y')
-    leitos_municipais_total['dia'] = leitos_municipais_total.data.apply(lambda d: d.strftime('%d %b %y'))
+    # taxa de letalidade até a data atual
+    dados['letalidade'] = ((dados[coluna_obitos] / dados[coluna_casos]) * 100).round(2).where(dados[coluna_casos] > 0)
 
-    return dados_cidade, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total
+    return dados
 
 
 def formata_municipio(m):
@@ -267,13 +1127,17 @@ def formata_municipio(m):
         .replace(' Dos ', ' dos ')
 
 
-def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, doses_aplicadas, doses_recebidas, dados_munic, dados_imunizantes, atualizacao_imunizantes):
+def pre_processamento_casos_estado(dados_estado):
     dados_estado.columns = ['data', 'total_casos', 'total_obitos']
     dados_estado['data'] = pd.to_datetime(dados_estado.data)
-    dados_estado['dia'] = dados_estado.data.apply(lambda d: d.strftime('%d %b %y'))
+    dados_estado['dia'] = formata_datas(dados_estado.data)
 
-    dados_munic['datahora'] = pd.to_datetime(dados_munic.datahora)
+    calcula_series_diarias(dados_estado, 'data', 'total_casos', 'total_obitos')
+
+    return dados_estado
 
+
+def pre_processamento_isolamento(isolamento):
     isolamento['data'] = pd.to_datetime(isolamento.data)
 
     dias_faltantes = []
@@ -323,14 +1187,18 @@ def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, interna
                 isolamento_atualizado['município'] = isolamento_atualizado.município.apply(lambda m: formata_municipio(m))
                 isolamento_atualizado['data'] = isolamento_atualizado.data.apply(
                     lambda d: datetime.strptime(d.split(', ')[1] + '/' + str(data.year), '%d/%m/%Y'))
-                isolamento_atualizado['dia'] = isolamento_atualizado.data.apply(lambda d: d.strftime('%d %b %y'))
+                isolamento_atualizado['dia'] = formata_datas(isolamento_atualizado.data)
 
                 isolamento = isolamento.append(isolamento_atualizado)
                 isolamento['data'] = pd.to_datetime(isolamento.data)
                 isolamento.sort_values(by=['data', 'isolamento'], inplace=True)
                 isolamento.to_csv('dados/isolamento_social.csv', sep=',', index=False)
+                registra_arquivo('dados/isolamento_social.csv')
+
+    return isolamento
 
-    print('\t\tAtualizando dados de internações...')
+
+def pre_processamento_internacoes(leitos_estaduais, internacoes, revisado_desde):
     leitos_estaduais['data'] = pd.to_datetime(leitos_estaduais.data, format='%d/%m/%Y')
 
     internacoes.columns = ['data', 'drs', 'pacientes_uti_mm7d', 'total_covid_uti_mm7d', 'ocupacao_leitos',
@@ -340,7 +1208,16 @@ def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, interna
                            'pacientes_enf_ultimo_dia', 'total_covid_enf_ultimo_dia']
 
     internacoes['data'] = pd.to_datetime(internacoes.data)
-    internacoes['dia'] = internacoes.data.apply(lambda d: d.strftime('%d %b %y'))
+    internacoes['dia'] = formata_datas(internacoes.data)
+
+    # as ocupações gravadas antes da última data de leitos_estaduais só mudam se o arquivo de internações foi
+    # revisado na origem: são recalculadas a última data, as posteriores e as revisadas
+    inicio = leitos_estaduais.data.max()
+
+    if revisado_desde is not None:
+        inicio = min(inicio, pd.to_datetime(revisado_desde))
+
+    recentes = internacoes.loc[internacoes.data >= inicio]
 
     if internacoes.data.max() > leitos_estaduais.data.max():
         novos_dados = {'data': internacoes.data.max(),
@@ -351,177 +1228,132 @@ def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, interna
 
         leitos_estaduais = leitos_estaduais.append(novos_dados, ignore_index=True)
 
-    def atualizaOcupacaoUTI(series):
-        ocupacao = internacoes.loc[(internacoes.drs == 'Estado de São Paulo') & (internacoes.data == series['data']), 'ocupacao_leitos_ultimo_dia']
-        series['sp_uti'] = ocupacao.item() if any(ocupacao) else series['sp_uti']
-
-        leitos_enf = internacoes.loc[(internacoes.drs == 'Estado de São Paulo') & (internacoes.data == series['data']), 'total_covid_enf_ultimo_dia']
-
-        if any(leitos_enf):
-            pacientes_enf = internacoes.loc[(internacoes.drs == 'Estado de São Paulo') & (internacoes.data == series['data']), 'pacientes_enf_ultimo_dia']
-            ocupacao = pacientes_enf.item() / leitos_enf.item()
-            series['sp_enfermaria'] = round(ocupacao * 100, 2)
-
-        filtro_drs = ((internacoes.drs.str.contains('SP')) | (internacoes.drs == 'Município de São Paulo'))
-        leitos = internacoes.loc[(filtro_drs) & (internacoes.data == series['data']), 'total_covid_uti_ultimo_dia'].sum()
-
-        if leitos > 0:
-            pacientes = internacoes.loc[(filtro_drs) & (internacoes.data == series['data']), 'pacientes_uti_ultimo_dia'].sum()
-            ocupacao = pacientes / leitos
-            series['rmsp_uti'] = round(ocupacao * 100, 2)
-
-        leitos_enf = internacoes.loc[(filtro_drs) & (internacoes.data == series['data']), 'total_covid_enf_ultimo_dia'].sum()
-
-        if leitos_enf > 0:
-            pacientes_enf = internacoes.loc[(filtro_drs) & (internacoes.data == series['data']), 'pacientes_enf_ultimo_dia'].sum()
-            ocupacao = pacientes_enf / leitos_enf
-            series['rmsp_enfermaria'] = round(ocupacao * 100, 2)
-
-        return series
-
-    leitos_estaduais = leitos_estaduais.apply(lambda linha: atualizaOcupacaoUTI(linha), axis=1)
-
-    leitos_estaduais['dia'] = leitos_estaduais.data.apply(lambda d: d.strftime('%d %b %y'))
+    # um único agrupamento por data e região: 'sp' é a linha do estado e 'rmsp' soma a capital e as DRS da Grande SP
+    regiao = pd.Series(None, index=recentes.index, dtype=object)
+    regiao.loc[recentes.drs == 'Estado de São Paulo'] = 'sp'
+    regiao.loc[(recentes.drs.str.contains('SP')) | (recentes.drs == 'Município de São Paulo')] = 'rmsp'
+
+    colunas = ['ocupacao_leitos_ultimo_dia', 'pacientes_uti_ultimo_dia', 'total_covid_uti_ultimo_dia',
+               'pacientes_enf_ultimo_dia', 'total_covid_enf_ultimo_dia']
+    agrupamento = recentes.groupby(['data', regiao.rename('regiao')])
+    ocupacao = agrupamento[colunas].sum(min_count=1)
+    ocupacao['registros'] = agrupamento.size()
+    ocupacao = ocupacao.unstack('regiao')
+    ocupacao.columns = [f'{r}_{c}' for c, r in ocupacao.columns]
+    # sem linhas de uma das regiões no período, as colunas dela também precisam existir
+    ocupacao = ocupacao.reindex(columns=[f'{r}_{c}' for r in ['sp', 'rmsp'] for c in colunas + ['registros']])
+
+    ocupacao = leitos_estaduais.loc[leitos_estaduais.data >= inicio, ['data']] \
+        .merge(ocupacao, how='left', left_on='data', right_index=True) \
+        .reindex(leitos_estaduais.index)
+    possui_estado = ocupacao['sp_registros'] > 0
+
+    # assim como antes, um valor ausente no registro do estado também substitui o valor atual
+    filtro = possui_estado & (ocupacao['sp_ocupacao_leitos_ultimo_dia'] != 0)
+    leitos_estaduais.loc[filtro, 'sp_uti'] = ocupacao.loc[filtro, 'sp_ocupacao_leitos_ultimo_dia']
+
+    filtro = possui_estado & (ocupacao['sp_total_covid_enf_ultimo_dia'] != 0)
+    leitos_estaduais.loc[filtro, 'sp_enfermaria'] = (ocupacao.loc[filtro, 'sp_pacientes_enf_ultimo_dia'] /
+                                                     ocupacao.loc[filtro, 'sp_total_covid_enf_ultimo_dia'] * 100).round(2)
+
+    filtro = ocupacao['rmsp_total_covid_uti_ultimo_dia'] > 0
+    leitos_estaduais.loc[filtro, 'rmsp_uti'] = (ocupacao.loc[filtro, 'rmsp_pacientes_uti_ultimo_dia'].fillna(0) /
+                                                ocupacao.loc[filtro, 'rmsp_total_covid_uti_ultimo_dia'] * 100).round(2)
+
+    filtro = ocupacao['rmsp_total_covid_enf_ultimo_dia'] > 0
+    leitos_estaduais.loc[filtro, 'rmsp_enfermaria'] = (ocupacao.loc[filtro, 'rmsp_pacientes_enf_ultimo_dia'].fillna(0) /
+                                                       ocupacao.loc[filtro, 'rmsp_total_covid_enf_ultimo_dia'] * 100).round(2)
+
+    leitos_estaduais['dia'] = formata_datas(leitos_estaduais.data)
     leitos_estaduais['data'] = leitos_estaduais.data.apply(lambda d: d.strftime('%d/%m/%Y'))
     colunas = ['data', 'sp_uti', 'sp_enfermaria', 'rmsp_uti', 'rmsp_enfermaria']
     leitos_estaduais[colunas].to_csv('dados/leitos_estaduais.csv', sep=',')
+    registra_arquivo('dados/leitos_estaduais.csv')
     leitos_estaduais['data'] = pd.to_datetime(leitos_estaduais.data, format='%d/%m/%Y')
 
-    print('\t\tAtualizando dados de doenças preexistentes...')
-
-    doencas.columns = ['municipio', 'codigo_ibge', 'idade', 'sexo', 'covid19', 'data_inicio_sintomas', 'obito', 'asma',
-                       'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica', 'doenca_neurologica',
-                       'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                       'sindrome_de_down']
-
-    if processa_doencas:
-        doencas = doencas.groupby(
-            ['obito', 'covid19', 'idade', 'sexo', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica',
-             'doenca_hepatica', 'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros',
-             'pneumopatia', 'puerpera', 'sindrome_de_down']) \
-            .agg({'asma': 'count', 'cardiopatia': 'count', 'diabetes': 'count', 'doenca_hematologica': 'count',
-                  'doenca_hepatica': 'count', 'doenca_neurologica': 'count', 'doenca_renal': 'count',
-                  'imunodepressao': 'count', 'obesidade': 'count', 'outros': 'count', 'pneumopatia': 'count',
-                  'puerpera': 'count', 'sindrome_de_down': 'count'})
-
-    def calcula_letalidade(series):
-        # localiza a linha atual passada como parâmetro e obtém a o índice da linha anterior
-        indice = dados_estado.index[dados_estado.data == series['data']].item() - 1
-
-        if indice >= 0:
-            series['casos_dia'] = series['total_casos'] - dados_estado.loc[indice, 'total_casos']
-            series['obitos_dia'] = series['total_obitos'] - dados_estado.loc[indice, 'total_obitos']
-        else:
-            series['casos_dia'] = series['total_casos']
-            series['obitos_dia'] = series['total_obitos']
-
-        # calcula a taxa de letalidade até a data atual
-        if series['total_casos'] > 0:
-            series['letalidade'] = round((series['total_obitos'] / series['total_casos']) * 100, 2)
+    return leitos_estaduais, internacoes
 
-        return series
-
-    dados_estado = dados_estado.apply(lambda linha: calcula_letalidade(linha), axis=1)
 
+def pre_processamento_raciais(dados_raciais):
     dados_raciais = dados_raciais[['obito', 'raca_cor']]
     dados_raciais = dados_raciais.fillna('IGNORADO')
     dados_raciais.loc[dados_raciais.raca_cor == 'NONE', 'raca_cor'] = 'IGNORADO'
     dados_raciais['raca_cor'] = dados_raciais.raca_cor.str.title()
     dados_raciais = dados_raciais.groupby(['obito', 'raca_cor']).agg(contagem=('obito', 'count'))
 
-    def obtem_dado_anterior(municipio, coluna):
-        indice = pd.Series(dtype='float64')
-        dia_anterior = data_processamento - timedelta(days=1)
-
-        data_inicio_vacinacao = dados_vacinacao.data.min().date()
-
-        while indice.empty and dia_anterior.date() >= data_inicio_vacinacao:
-            indice = dados_vacinacao.index[(dados_vacinacao.data.dt.date == dia_anterior.date()) &
-                                           (dados_vacinacao.municipio == municipio)]
-            dia_anterior = dia_anterior - timedelta(days=1)
-
-        if not indice.empty:
-            return dados_vacinacao.loc[indice.item(), coluna]
-
-        return None if coluna != 'dose_unica' else 0
-
-    def atualiza_doses(municipio):
-        temp = doses_aplicadas.loc[doses_aplicadas['municipio'] == municipio]
-
-        doses = temp.loc[temp.dose == '1º DOSE', 'contagem']
-        primeira_dose = int(doses.iat[0]) if not doses.empty else None
+    return dados_raciais
 
-        if primeira_dose is None:
-            primeira_dose = obtem_dado_anterior(municipio, '1a_dose')
 
-        doses = temp.loc[temp.dose == '2º DOSE', 'contagem']
-        segunda_dose = int(doses.iat[0]) if not doses.empty else None
+def pre_processamento_vacinacao(dados_vacinacao, doses_aplicadas, doses_recebidas, internacoes, dados_imunizantes, atualizacao_imunizantes):
+    dados_anteriores = None
 
-        if segunda_dose is None:
-            segunda_dose = obtem_dado_anterior(municipio, '2a_dose')
+    def obtem_dados_anteriores():
+        # último registro de cada município antes da data de processamento (consulta "as-of"), obtido
+        # uma única vez para todas as colunas: as atualizações do dia não alteram os registros anteriores
+        anteriores = dados_vacinacao.loc[dados_vacinacao.data.dt.normalize() < pd.Timestamp(data_processamento.date())]
+        anteriores = anteriores.sort_values(by=['municipio', 'data'], kind='mergesort')
 
-        doses = temp.loc[temp.dose == '1º DOSE ADICIONAL', 'contagem']
-        terceira_dose = int(doses.iat[0]) if not doses.empty else None
+        return anteriores.groupby('municipio').tail(1).set_index('municipio')
 
-        if terceira_dose is None:
-            terceira_dose = obtem_dado_anterior(municipio, '3a_dose')
-
-        doses = temp.loc[temp.dose == '2º DOSE ADICIONAL', 'contagem']
-        quarta_dose = int(doses.iat[0]) if not doses.empty else None
-
-        if quarta_dose is None:
-            quarta_dose = obtem_dado_anterior(municipio, '4a_dose')
+    def obtem_dado_anterior(municipio, coluna):
+        if municipio in dados_anteriores.index:
+            return dados_anteriores.at[municipio, coluna]
 
-        doses = temp.loc[temp.dose == '3º DOSE ADICIONAL', 'contagem']
-        quinta_dose = int(doses.iat[0]) if not doses.empty else None
+        return None if coluna != 'dose_unica' else 0
 
-        if quinta_dose is None:
-            quinta_dose = obtem_dado_anterior(municipio, '5a_dose')
+    # primeira contagem de cada (município, tipo de dose) e de doses recebidas por município, montadas uma única vez
+    aplicadas_por_municipio = {}
+    recebidas_por_municipio = {}
 
-        doses = temp.loc[temp.dose == '4º DOSE ADICIONAL', 'contagem']
-        sexta_dose = int(doses.iat[0]) if not doses.empty else None
+    def indexa_doses():
+        tipos = doses_aplicadas.dose.astype(str).replace('UNICA', 'ÚNICA')
+        primeiras = doses_aplicadas.assign(dose=tipos).drop_duplicates(['municipio', 'dose'])
+        aplicadas_por_municipio.update(zip(zip(primeiras.municipio, primeiras.dose), primeiras.contagem))
 
-        if sexta_dose is None:
-            sexta_dose = obtem_dado_anterior(municipio, '6a_dose')
+        if doses_recebidas is not None:
+            primeiras = doses_recebidas.drop_duplicates('municipio')
+            recebidas_por_municipio.update(zip(primeiras.municipio, primeiras.contagem))
 
-        doses = temp.loc[(temp.dose == 'ÚNICA') | (temp.dose == 'UNICA'), 'contagem']
-        dose_unica = int(doses.iat[0]) if not doses.empty else None
+    def obtem_doses(municipio, dose, coluna):
+        if (municipio, dose) in aplicadas_por_municipio:
+            return int(aplicadas_por_municipio[(municipio, dose)])
 
-        if dose_unica is None:
-            dose_unica = obtem_dado_anterior(municipio, 'dose_unica')
+        return obtem_dado_anterior(municipio, coluna)
 
+    def atualiza_doses(municipio):
         if doses_recebidas is None:
             recebidas = obtem_dado_anterior(municipio, 'doses_recebidas')
         else:
-            recebidas = doses_recebidas.loc[doses_recebidas.municipio == municipio, 'contagem']
-            recebidas = None if recebidas.empty else recebidas.iat[0]
-
+            recebidas = recebidas_por_municipio.get(municipio)
+
+        return {'municipio': municipio,
+                'doses_recebidas': recebidas,
+                '1a_dose': obtem_doses(municipio, '1º DOSE', '1a_dose'),
+                '2a_dose': obtem_doses(municipio, '2º DOSE', '2a_dose'),
+                '3a_dose': obtem_doses(municipio, '1º DOSE ADICIONAL', '3a_dose'),
+                '4a_dose': obtem_doses(municipio, '2º DOSE ADICIONAL', '4a_dose'),
+                '5a_dose': obtem_doses(municipio, '3º DOSE ADICIONAL', '5a_dose'),
+                '6a_dose': obtem_doses(municipio, '4º DOSE ADICIONAL', '6a_dose'),
+                'dose_unica': obtem_doses(municipio, 'ÚNICA', 'dose_unica')}
+
+    def atualiza_municipios(municipios):
+        # as doses de todos os municípios são aplicadas de uma vez: os registros do dia que já existem são
+        # encontrados com um único merge e os demais municípios ganham linhas novas
         nonlocal dados_vacinacao
-        filtro = (dados_vacinacao.municipio == municipio) & (dados_vacinacao.data.dt.date == data_processamento.date())
-        busca = dados_vacinacao.loc[filtro, 'municipio']
+        atualizacoes = pd.DataFrame([atualiza_doses(m) for m in municipios])
+        colunas = list(atualizacoes.columns.drop('municipio'))
 
-        if busca.empty:
-            novos_dados = {'data': data_processamento,
-                           'municipio': municipio,
-                           'doses_recebidas': recebidas,
-                           '1a_dose': primeira_dose,
-                           '2a_dose': segunda_dose,
-                           '3a_dose': terceira_dose,
-                           '4a_dose': quarta_dose,
-                           '5a_dose': quinta_dose,
-                           '6a_dose': sexta_dose,
-                           'dose_unica': dose_unica}
+        filtro = dados_vacinacao.data.dt.date == data_processamento.date()
+        existentes = dados_vacinacao.loc[filtro, ['municipio']].reset_index().merge(atualizacoes, on='municipio')
 
-            dados_vacinacao = dados_vacinacao.append(novos_dados, ignore_index=True)
-        else:
-            dados_vacinacao.loc[filtro, 'doses_recebidas'] = recebidas
-            dados_vacinacao.loc[filtro, '1a_dose'] = primeira_dose
-            dados_vacinacao.loc[filtro, '2a_dose'] = segunda_dose
-            dados_vacinacao.loc[filtro, '3a_dose'] = terceira_dose
-            dados_vacinacao.loc[filtro, '4a_dose'] = quarta_dose
-            dados_vacinacao.loc[filtro, '5a_dose'] = quinta_dose
-            dados_vacinacao.loc[filtro, '6a_dose'] = sexta_dose
-            dados_vacinacao.loc[filtro, 'dose_unica'] = dose_unica
+        for coluna in colunas:
+            dados_vacinacao.loc[existentes['index'], coluna] = existentes[coluna].values
+
+        novas_linhas = atualizacoes.loc[~atualizacoes.municipio.isin(existentes.municipio)]
+
+        if not novas_linhas.empty:
+            novas_linhas.insert(0, 'data', data_processamento)
+            dados_vacinacao = dados_vacinacao.append(novas_linhas.to_dict('records'), ignore_index=True)
 
     def atualiza_populacao():
         pop_cidade = internacoes.loc[(internacoes.drs == 'Município de São Paulo') &
@@ -614,126 +1446,41 @@ def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, interna
             dados_vacinacao.loc[filtro_d & filtro_e, 'dose_unica'] = dose_unica
             dados_vacinacao.loc[filtro_d & filtro_e, 'populacao'] = internacoes.loc[(internacoes.drs == 'Estado de São Paulo') & (internacoes.data == internacoes.data.max()), 'pop'].iat[0]
 
-    def calcula_campos_adicionais(linha):
-        primeira_dose = 0 if linha['1a_dose'] is None or isnan(linha['1a_dose']) else linha['1a_dose']
-        segunda_dose = 0 if linha['2a_dose'] is None or isnan(linha['2a_dose']) else linha['2a_dose']
-        terceira_dose = 0 if linha['3a_dose'] is None or isnan(linha['3a_dose']) else linha['3a_dose']
-        quarta_dose = 0 if linha['4a_dose'] is None or isnan(linha['4a_dose']) else linha['4a_dose']
-        quinta_dose = 0 if linha['5a_dose'] is None or isnan(linha['5a_dose']) else linha['5a_dose']
-        sexta_dose = 0 if linha['6a_dose'] is None or isnan(linha['6a_dose']) else linha['6a_dose']
-        dose_unica = 0 if linha['dose_unica'] is None or isnan(linha['dose_unica']) else linha['dose_unica']
-        populacao = 0 if linha['populacao'] is None or isnan(linha['populacao']) else linha['populacao']
-        doses_recebidas = 0 if linha['doses_recebidas'] is None or isnan(linha['doses_recebidas']) else linha['doses_recebidas']
-
-        linha['total_doses'] = primeira_dose + segunda_dose + terceira_dose + quarta_dose + quinta_dose + sexta_dose + dose_unica
-
-        try:
-            linha['perc_vacinadas_1a_dose'] = (primeira_dose / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_1a_dose'] = None
-
-        try:
-            linha['perc_vacinadas_2a_dose'] = (segunda_dose / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_2a_dose'] = None
-
-        try:
-            linha['perc_vacinadas_3a_dose'] = (terceira_dose / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_3a_dose'] = None
-
-        try:
-            linha['perc_vacinadas_4a_dose'] = (quarta_dose / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_4a_dose'] = None
-
-        try:
-            linha['perc_vacinadas_5a_dose'] = (quinta_dose / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_5a_dose'] = None
-
-        try:
-            linha['perc_vacinadas_6a_dose'] = (sexta_dose / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_6a_dose'] = None
-
-        try:
-            linha['perc_vacinadas_dose_unica'] = (dose_unica / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_dose_unica'] = None
-
-        try:
-            linha['perc_vacinadas_1a_dose_dose_unica'] = ((primeira_dose + dose_unica) / populacao) * 100
-        except Exception:
-            linha['perc_vacinadas_1a_dose_dose_unica'] = None
-
-        linha['perc_imunizadas'] = linha['perc_vacinadas_3a_dose']
-
-        try:
-            if doses_recebidas == 0:
-                doses_recebidas = obtem_dado_anterior(linha['municipio'], 'doses_recebidas')
-
-            linha['perc_aplicadas'] = (linha['total_doses'] / doses_recebidas) * 100
-        except Exception:
-            linha['perc_aplicadas'] = None
-
-        total_doses_anterior = obtem_dado_anterior(linha['municipio'], 'total_doses')
-
-        if total_doses_anterior is None:
-            linha['aplicadas_dia'] = linha['total_doses']
-        else:
-            linha['aplicadas_dia'] = linha['total_doses'] - total_doses_anterior
-
-        primeira_dose_anterior = obtem_dado_anterior(linha['municipio'], '1a_dose')
-
-        if primeira_dose_anterior is None:
-            linha['primeira_dose_dia'] = linha['1a_dose']
-        else:
-            linha['primeira_dose_dia'] = linha['1a_dose'] - primeira_dose_anterior
-
-        segunda_dose_anterior = obtem_dado_anterior(linha['municipio'], '2a_dose')
-
-        if segunda_dose_anterior is None:
-            linha['segunda_dose_dia'] = linha['2a_dose']
-        else:
-            linha['segunda_dose_dia'] = linha['2a_dose'] - segunda_dose_anterior
-
-        terceira_dose_anterior = obtem_dado_anterior(linha['municipio'], '3a_dose')
+    def calcula_campos_adicionais(filtro):
+        dados = dados_vacinacao.loc[filtro]
+        doses_dia = {'1a_dose': 'primeira_dose_dia', '2a_dose': 'segunda_dose_dia', '3a_dose': 'terceira_dose_dia',
+                     '4a_dose': 'quarta_dose_dia', '5a_dose': 'quinta_dose_dia', '6a_dose': 'sexta_dose_dia',
+                     'dose_unica': 'dose_unica_dia'}
 
-        if terceira_dose_anterior is None:
-            linha['terceira_dose_dia'] = linha['3a_dose']
-        else:
-            linha['terceira_dose_dia'] = linha['3a_dose'] - terceira_dose_anterior
-
-        quarta_dose_anterior = obtem_dado_anterior(linha['municipio'], '4a_dose')
-
-        if quarta_dose_anterior is None:
-            linha['quarta_dose_dia'] = linha['4a_dose']
-        else:
-            linha['quarta_dose_dia'] = linha['4a_dose'] - quarta_dose_anterior
+        # valores ausentes contam como zero; sem população (ou doses recebidas) o percentual fica vazio
+        doses = dados[list(doses_dia)].fillna(0)
+        populacao = dados.populacao.fillna(0)
+        populacao = populacao.where(populacao != 0)
+        doses_recebidas = dados.doses_recebidas.fillna(0)
 
-        quinta_dose_anterior = obtem_dado_anterior(linha['municipio'], '5a_dose')
+        total_doses = doses.sum(axis=1)
+        dados_vacinacao.loc[filtro, 'total_doses'] = total_doses
 
-        if quinta_dose_anterior is None:
-            linha['quinta_dose_dia'] = linha['5a_dose']
-        else:
-            linha['quinta_dose_dia'] = linha['5a_dose'] - quinta_dose_anterior
+        for coluna in doses_dia:
+            dados_vacinacao.loc[filtro, f'perc_vacinadas_{coluna}'] = (doses[coluna] / populacao) * 100
 
-        sexta_dose_anterior = obtem_dado_anterior(linha['municipio'], '6a_dose')
+        dados_vacinacao.loc[filtro, 'perc_vacinadas_1a_dose_dose_unica'] = ((doses['1a_dose'] + doses['dose_unica']) / populacao) * 100
+        dados_vacinacao.loc[filtro, 'perc_imunizadas'] = dados_vacinacao.loc[filtro, 'perc_vacinadas_3a_dose']
 
-        if sexta_dose_anterior is None:
-            linha['sexta_dose_dia'] = linha['6a_dose']
-        else:
-            linha['sexta_dose_dia'] = linha['6a_dose'] - sexta_dose_anterior
+        # registro anterior de cada município, se houver
+        anteriores = dados_anteriores.reindex(dados.municipio)
+        anteriores.index = dados.index
+        possui_anterior = dados.municipio.isin(dados_anteriores.index)
 
-        dose_unica_anterior = obtem_dado_anterior(linha['municipio'], 'dose_unica')
+        doses_recebidas = doses_recebidas.where(doses_recebidas != 0, anteriores.doses_recebidas)
+        doses_recebidas = doses_recebidas.where(doses_recebidas != 0)
+        dados_vacinacao.loc[filtro, 'perc_aplicadas'] = (total_doses / doses_recebidas) * 100
 
-        if dose_unica_anterior is None:
-            linha['dose_unica_dia'] = linha['dose_unica']
-        else:
-            linha['dose_unica_dia'] = linha['dose_unica'] - dose_unica_anterior
+        # doses do dia: diferença para o registro anterior ou, se não houver, o próprio total
+        dados_vacinacao.loc[filtro, 'aplicadas_dia'] = total_doses.where(~possui_anterior, total_doses - anteriores.total_doses)
 
-        return linha
+        for coluna, coluna_dia in doses_dia.items():
+            dados_vacinacao.loc[filtro, coluna_dia] = dados[coluna].where(~possui_anterior, dados[coluna] - anteriores[coluna])
 
     global vacinacao
 
@@ -762,9 +1509,15 @@ def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, interna
             doses_aplicadas['dose'] = doses_aplicadas.dose.str.replace('횣', 'U')
             doses_aplicadas.loc[doses_aplicadas.municipio.str.contains('O PAULO'), 'municipio'] = 'SAO PAULO'
             doses_aplicadas['municipio'] = doses_aplicadas.municipio.apply(lambda m: ''.join(c for c in unicodedata.normalize('NFD', m.upper()) if unicodedata.category(c) != 'Mn'))
+            # os nomes só são categorizados depois de normalizados
+            doses_aplicadas = aplica_esquema(doses_aplicadas, 'doses_aplicadas')
 
             print(f'\t\t\tAtualizando doses... {datetime.now():%H:%M:%S}')
-            atualiza_doses('SAO PAULO')
+            dados_anteriores = obtem_dados_anteriores()
+            indexa_doses()
+
+            municipios = doses_aplicadas.municipio.unique() if vacinacao_todos_municipios else ['SAO PAULO']
+            atualiza_municipios(municipios)
 
             print(f'\t\t\tAtualizando população... {datetime.now():%H:%M:%S}')
             atualiza_populacao()
@@ -773,14 +1526,14 @@ def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, interna
             atualiza_estado()
 
             print(f'\t\t\tCalculando campos adicionais... {datetime.now():%H:%M:%S}')
-            dados_vacinacao.loc[dados_vacinacao.data.dt.date == hoje.date()] = \
-                dados_vacinacao.loc[dados_vacinacao.data.dt.date == hoje.date()].apply(lambda linha: calcula_campos_adicionais(linha), axis=1)
+            calcula_campos_adicionais(dados_vacinacao.data.dt.date == hoje.date())
 
             print(f'\t\t\tOrdenando e salvando dados vacinação... {datetime.now():%H:%M:%S}')
             dados_vacinacao.sort_values(by=['data', 'municipio'], ascending=True, inplace=True)
             dados_vacinacao['data'] = dados_vacinacao.data.apply(lambda d: d.strftime('%d/%m/%Y'))
             opcoes_zip = dict(method='zip', archive_name='dados_vacinacao.csv')
             dados_vacinacao.to_csv('dados/dados_vacinacao.zip', index=False, compression=opcoes_zip)
+            registra_arquivo('dados/dados_vacinacao.zip')
             dados_vacinacao['data'] = pd.to_datetime(dados_vacinacao.data, format='%d/%m/%Y')
 
         print(f'\t\t\tAtualizando imunizantes... {datetime.now():%H:%M:%S}')
@@ -799,70 +1552,160 @@ def pre_processamento_estado(dados_estado, isolamento, leitos_estaduais, interna
                 dados_imunizantes['data'] = dados_imunizantes['data'].apply(lambda d: d.strftime('%d/%m/%Y'))
                 dados_imunizantes = dados_imunizantes.astype({'aplicadas': 'int32'})
                 dados_imunizantes.to_csv('dados/dados_imunizantes.csv', index=False)
+                registra_arquivo('dados/dados_imunizantes.csv')
                 dados_imunizantes['data'] = pd.to_datetime(dados_imunizantes.data, format='%d/%m/%Y')
 
-    return dados_estado, isolamento, leitos_estaduais, internacoes, doencas, dados_raciais, dados_vacinacao, dados_munic, dados_imunizantes
+    # as novas linhas do dia chegam como texto
+    return aplica_esquema(dados_vacinacao, 'dados_vacinacao'), dados_imunizantes
+
+
+# visões montadas a partir dos DataFrames já processados: origem, coluna da entidade e coluna da data
+VISOES = {'visao_munic': ('dados_munic', 'nome_munic', 'datahora'),
+          'visao_estado': ('dados_estado', None, 'data'),
+          'visao_leitos': ('leitos_estaduais', None, 'data'),
+          'visao_isolamento': ('isolamento', 'município', 'data'),
+          'visao_internacoes': ('internacoes', 'drs', 'data'),
+          'visao_vacinacao': ('dados_vacinacao', 'municipio', 'data')}
+
+
+def monta_visao(dados, coluna_entidade, coluna_data):
+    # índice de um DataFrame por entidade (DRS, município), montado uma única vez: guarda as posições das linhas
+    # de cada entidade, na ordem original, para que os gráficos não precisem filtrar o DataFrame inteiro a cada
+    # consulta; sem coluna_entidade, todas as linhas formam uma única entidade
+    if coluna_entidade is None:
+        entidades = {None: np.arange(len(dados))}
+    else:
+        entidades = dados.groupby(coluna_entidade, sort=False).indices
+
+    # para as consultas por data, as posições de cada entidade também ficam ordenadas pela data (ordenação
+    # estável, que mantém a ordem original das linhas de uma mesma data), ao lado das datas já convertidas
+    todas_datas = dados[coluna_data].to_numpy().astype('datetime64[D]')
+    datas = {}
+
+    for entidade, posicoes in entidades.items():
+        ordem = np.argsort(todas_datas[posicoes], kind='stable')
+        datas[entidade] = (todas_datas[posicoes][ordem], posicoes[ordem])
+
+    return {'dados': dados, 'entidades': entidades, 'datas': datas}
+
+
+def monta_visoes(dados, assinaturas):
+    # as visões só indexam os DataFrames e são montadas a cada execução, sem passar pelo cache de etapas: a
+    # assinatura de cada uma é a do DataFrame de origem
+    for nome, (origem, coluna_entidade, coluna_data) in VISOES.items():
+        dados[nome] = monta_visao(dados[origem], coluna_entidade, coluna_data)
+        assinaturas[nome] = assinaturas[origem]
+
+
+def fatia_visao(visao, *entidades):
+    # linhas de uma ou mais entidades, na ordem em que aparecem nos dados
+    posicoes = [visao['entidades'][e] for e in entidades if e in visao['entidades']]
+    posicoes = np.sort(np.concatenate(posicoes)) if posicoes else np.empty(0, dtype='int64')
+
+    return visao['dados'].take(posicoes)
+
+
+def divide_por_entidade(visao, colunas):
+    # separa as séries de todas as entidades em uma única passada: cada coluna (alinhada às linhas da visão)
+    # é convertida uma vez e as séries de cada entidade são fatias dela, na ordem original das linhas
+    valores = {c: colunas[c].to_numpy() for c in colunas.columns}
+
+    return {entidade: {c: v[posicoes] for c, v in valores.items()}
+            for entidade, posicoes in visao['entidades'].items()}
+
+
+def valor_visao(visao, data, coluna, entidade=None):
+    # valores da coluna na data informada (vazio quando não há registro), como o filtro por entidade e data;
+    # a busca binária nas datas ordenadas da entidade dá o intervalo de posições com aquela data
+    if entidade not in visao['datas']:
+        return visao['dados'][coluna].take(np.empty(0, dtype='int64'))
+
+    datas, posicoes = visao['datas'][entidade]
+    dia = np.datetime64(data, 'D')
+
+    return visao['dados'][coluna].take(posicoes[np.searchsorted(datas, dia):np.searchsorted(datas, dia, 'right')])
+
+
+# abreviações dos meses como no locale pt_BR, para que a formatação não dependa do locale do processo
+MESES = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez']
+
+
+@lru_cache(maxsize=None)
+def formata_data(data, formato='%d %b %y'):
+    return data.strftime(formato.replace('%b', MESES[data.month - 1]))
+
+
+def formata_datas(datas, formato='%d %b %y'):
+    # cada data distinta é formatada uma única vez (e reaproveitada entre os dataframes)
+    rotulos = {data: formata_data(data, formato) for data in datas.dropna().drop_duplicates()}
+
+    return datas.map(rotulos)
+
+
+# http://portalsinan.saude.gov.br/calendario-epidemiologico-2020
+# as semanas epidemiológicas vão de domingo a sábado e são numeradas a partir da 1ª semana de 2020
+INICIO_SEMANAS = pd.Timestamp('2019-12-29')
+
+
+def gera_calendario_epidemiologico(inicio, fim):
+    # uma linha por dia do intervalo com o número da semana epidemiológica
+    dias = pd.date_range(pd.Timestamp(inicio).normalize(), pd.Timestamp(fim).normalize(), freq='D')
+
+    return pd.Series((dias - INICIO_SEMANAS).days // 7, index=dias, name='semana')
 
 
 def _converte_semana(data):
-    convertion = data.strftime('%Y-W%U')
+    return (pd.Timestamp(data).normalize() - INICIO_SEMANAS).days // 7
 
-    if 'W00' in convertion:
-        last_year = int(convertion.split('-')[0]) - 1
-        convertion = pd.to_datetime('12-31-' + str(last_year)).strftime('%Y-W%U')
 
-    return convertion
+def _converte_semanas(datas):
+    # o calendário cobre uma única vez o intervalo das datas e é consultado por todas as linhas
+    calendario = gera_calendario_epidemiologico(datas.min(), datas.max())
 
+    return datas.dt.normalize().map(calendario)
+
+
+@lru_cache(maxsize=None)
+def _formata_semana_extenso(semana, inclui_ano=True):
+    inicio = INICIO_SEMANAS + timedelta(weeks=int(semana))
+    fim = inicio + timedelta(days=6)
 
-def _formata_semana_extenso(data, inclui_ano=True):
-    # http://portalsinan.saude.gov.br/calendario-epidemiologico-2020
     if inclui_ano:
-        return datetime.strptime(data + '-0', '%Y-W%U-%w').strftime('%d/%b/%y') + ' a ' + \
-               datetime.strptime(data + '-6', '%Y-W%U-%w').strftime('%d/%b/%y')
+        return formata_data(inicio, '%d/%b/%y') + ' a ' + formata_data(fim, '%d/%b/%y')
     else:
-        return datetime.strptime(data + '-0', '%Y-W%U-%w').strftime('%d/%b') + ' a ' + \
-               datetime.strptime(data + '-6', '%Y-W%U-%w').strftime('%d/%b')
+        return formata_data(inicio, '%d/%b') + ' a ' + formata_data(fim, '%d/%b')
 
 
-def gera_dados_evolucao_pandemia(dados_munic, dados_estado, isolamento, dados_vacinacao, internacoes):
-    print('\tProcessando dados da evolução da pandemia...')
+def gera_dados_evolucao_pandemia(visao_munic, dados_estado, visao_isolamento, visao_vacinacao, visao_internacoes):
     # criar dataframe relação: comparar média de isolamento social de duas
     # semanas atrás com a quantidade de casos e de óbitos da semana atual
-    isolamento['data_futuro'] = isolamento.data.apply(lambda d: d + timedelta(weeks=2))
-
-    filtro = isolamento.município == 'Estado de São Paulo'
-    colunas = ['data_futuro', 'isolamento']
-    esquerda = isolamento.loc[filtro, colunas].groupby(['data_futuro']).mean().reset_index()
-    esquerda.columns = ['data', 'isolamento']
+    isolamento = fatia_visao(visao_isolamento, 'Estado de São Paulo')
+    esquerda = isolamento.groupby(isolamento.data + timedelta(weeks=2)).isolamento.mean().reset_index()
 
     estado = dados_estado[['data', 'obitos_dia', 'casos_dia']].groupby(['data']).sum().reset_index()
     estado.columns = ['data', 'obitos_semana', 'casos_semana']
 
     estado = esquerda.merge(estado, on=['data'], how='outer', suffixes=('_isolamento', '_estado'))
 
-    filtro = dados_vacinacao.municipio == 'ESTADO DE SAO PAULO'
     colunas = ['data', 'aplicadas_dia', 'perc_imunizadas']
-    vacinacao = dados_vacinacao.loc[filtro, colunas].groupby(['data']).sum().reset_index()
+    vacinacao = fatia_visao(visao_vacinacao, 'ESTADO DE SAO PAULO')[colunas].groupby(['data']).sum().reset_index()
     vacinacao.columns = ['data', 'vacinadas_semana', 'perc_imu_semana']
 
     estado = vacinacao.merge(estado, on=['data'], how='outer', suffixes=('_vacinacao', '_estado'))
 
-    filtro = internacoes.drs == 'Estado de São Paulo'
     colunas = ['data', 'internacoes_ultimo_dia']
-    intern = internacoes.loc[filtro, colunas].groupby(['data']).sum().reset_index()
+    intern = fatia_visao(visao_internacoes, 'Estado de São Paulo')[colunas].groupby(['data']).sum().reset_index()
     intern.columns = ['data', 'internacoes_semana']
 
     estado = intern.merge(estado, on=['data'], how='outer', suffixes=('_internacoes', '_estado'))
 
-    estado['data'] = estado.data.apply(lambda d: _converte_semana(d))
+    estado['semana'] = _converte_semanas(estado.data)
 
-    estado = estado.groupby('data') \
+    estado = estado.groupby('semana') \
                    .agg({'isolamento': 'mean', 'obitos_semana': sum, 'casos_semana': sum,
                          'vacinadas_semana': sum, 'perc_imu_semana': max, 'internacoes_semana': sum}) \
                    .reset_index()
 
-    estado['data'] = estado.data.apply(lambda d: _formata_semana_extenso(d))
-
     estado['casos_semana'] = estado.casos_semana.apply(lambda c: nan if c == 0 else c)
     estado['obitos_semana'] = estado.obitos_semana.apply(lambda c: nan if c == 0 else c)
     estado['vacinadas_semana'] = estado.vacinadas_semana.apply(lambda c: nan if c == 0 else c)
@@ -871,182 +1714,337 @@ def gera_dados_evolucao_pandemia(dados_munic, dados_estado, isolamento, dados_va
     evolucao_estado = estado
 
     # dados municipais
-    filtro = isolamento.município == 'São Paulo'
-    colunas = ['data_futuro', 'isolamento']
-    esquerda = isolamento.loc[filtro, colunas].groupby(['data_futuro']).mean().reset_index()
-    esquerda.columns = ['data', 'isolamento']
+    isolamento = fatia_visao(visao_isolamento, 'São Paulo')
+    esquerda = isolamento.groupby(isolamento.data + timedelta(weeks=2)).isolamento.mean().reset_index()
 
-    # cidade = dados_cidade[['data', 'óbitos_dia', 'casos_dia']].groupby(['data']).sum().reset_index()
-    cidade = dados_munic.loc[dados_munic.nome_munic == 'São Paulo', ['datahora', 'obitos_novos', 'casos_novos']].groupby(['datahora']).sum().reset_index()
+    cidade = fatia_visao(visao_munic, 'São Paulo')[['datahora', 'obitos_dia', 'casos_dia']].groupby(['datahora']).sum().reset_index()
     cidade.columns = ['data', 'obitos_semana', 'casos_semana']
 
     cidade = esquerda.merge(cidade, on=['data'], how='outer', suffixes=('_isolamento', '_cidade'))
 
-    filtro = dados_vacinacao.municipio == 'SAO PAULO'
     colunas = ['data', 'aplicadas_dia', 'perc_imunizadas']
-    vacinacao = dados_vacinacao.loc[filtro, colunas].groupby(['data']).sum().reset_index()
+    vacinacao = fatia_visao(visao_vacinacao, 'SAO PAULO')[colunas].groupby(['data']).sum().reset_index()
     vacinacao.columns = ['data', 'vacinadas_semana', 'perc_imu_semana']
 
     cidade = vacinacao.merge(cidade, on=['data'], how='outer', suffixes=('_vacinacao', '_cidade'))
 
-    filtro = ((internacoes.drs.str.contains('SP')) | (internacoes.drs == 'Município de São Paulo'))
+    drs_grande_sp = [d for d in visao_internacoes['entidades'] if 'SP' in d or d == 'Município de São Paulo']
     colunas = ['data', 'internacoes_ultimo_dia']
-    intern = internacoes.loc[filtro, colunas].groupby(['data']).sum().reset_index()
+    intern = fatia_visao(visao_internacoes, *drs_grande_sp)[colunas].groupby(['data']).sum().reset_index()
     intern.columns = ['data', 'internacoes_semana']
 
     cidade = intern.merge(cidade, on=['data'], how='outer', suffixes=('_internacoes', '_estado'))
 
-    cidade['data'] = cidade.data.apply(lambda d: _converte_semana(d))
+    cidade['semana'] = _converte_semanas(cidade.data)
 
-    cidade = cidade.groupby('data') \
+    cidade = cidade.groupby('semana') \
                    .agg({'isolamento': 'mean', 'obitos_semana': sum, 'casos_semana': sum,
                          'vacinadas_semana': sum, 'perc_imu_semana': max, 'internacoes_semana': sum}) \
                    .reset_index()
 
-    cidade['data'] = cidade.data.apply(lambda d: _formata_semana_extenso(d))
-
     cidade['casos_semana'] = cidade.casos_semana.apply(lambda c: nan if c == 0 else c)
     cidade['obitos_semana'] = cidade.obitos_semana.apply(lambda c: nan if c == 0 else c)
     cidade['vacinadas_semana'] = cidade.vacinadas_semana.apply(lambda c: nan if c == 0 else c)
-    estado['internacoes_semana'] = estado.internacoes_semana.apply(lambda c: nan if c == 0 else c)
+    cidade['internacoes_semana'] = cidade.internacoes_semana.apply(lambda c: nan if c == 0 else c)
 
     evolucao_cidade = cidade
 
     return evolucao_cidade, evolucao_estado
 
 
-def gera_dados_semana(evolucao_cidade, evolucao_estado, leitos_estaduais, isolamento, internacoes):
-    print('\tProcessando dados semanais...')
-
-    def calcula_variacao(dados, linha):
-        indice = dados.index[dados.data == linha['data']].item() - 1
-
-        if indice >= 0:
-            casos_anterior = dados.loc[indice, 'casos_semana']
-            obitos_anterior = dados.loc[indice, 'obitos_semana']
-            uti_anterior = dados.loc[indice, 'uti']
-            isolamento_anterior = dados.loc[indice, 'isolamento_atual']
-            isolamento_2sem_anterior = dados.loc[indice, 'isolamento']
-            vacinadas_anterior = dados.loc[indice, 'vacinadas_semana']
-            perc_imu_semana_anterior = dados.loc[indice, 'perc_imu_semana']
-            internacoes_semana_anterior = dados.loc[indice, 'internacoes_semana']
+def calcula_variacao(dados, defasagens=(1,)):
+    # variação percentual de cada indicador em relação a n semanas antes, obtida pela chave da semana;
+    # a defasagem de 1 semana gera as colunas variacao_*, as demais recebem o sufixo _defasagem_n
+    colunas = {'casos_semana': 'variacao_casos',
+               'obitos_semana': 'variacao_obitos',
+               'uti': 'variacao_uti',
+               'isolamento_atual': 'variacao_isolamento',
+               'isolamento': 'variacao_isolamento_2sem',
+               'vacinadas_semana': 'variacao_vacinadas',
+               'perc_imu_semana': 'variacao_perc_imu',
+               'internacoes_semana': 'variacao_internacoes'}
 
-            if casos_anterior > 0:
-                linha['variacao_casos'] = ((linha['casos_semana'] / casos_anterior) - 1) * 100
+    atuais = dados[list(colunas)].set_index(dados.semana)
 
-            if obitos_anterior > 0:
-                linha['variacao_obitos'] = ((linha['obitos_semana'] / obitos_anterior) - 1) * 100
+    for defasagem in defasagens:
+        sufixo = '' if defasagem == 1 else f'_defasagem_{defasagem}'
 
-            if uti_anterior > 0:
-                linha['variacao_uti'] = ((linha['uti'] / uti_anterior) - 1) * 100
+        anteriores = atuais.copy()
+        anteriores.index = anteriores.index + defasagem
+        anteriores = anteriores.reindex(dados.semana)
+        anteriores.index = dados.index
 
-            if isolamento_anterior > 0:
-                linha['variacao_isolamento'] = ((linha['isolamento_atual'] / isolamento_anterior) - 1) * 100
+        for coluna, variacao in colunas.items():
+            anterior = anteriores[coluna]
+            dados[variacao + sufixo] = (((dados[coluna] / anterior) - 1) * 100).where(anterior > 0)
 
-            if isolamento_2sem_anterior > 0:
-                linha['variacao_isolamento_2sem'] = ((linha['isolamento'] / isolamento_2sem_anterior) - 1) * 100
+    return dados
 
-            if vacinadas_anterior > 0:
-                linha['variacao_vacinadas'] = ((linha['vacinadas_semana'] / vacinadas_anterior) - 1) * 100
-
-            if perc_imu_semana_anterior > 0:
-                linha['variacao_perc_imu'] = ((linha['perc_imu_semana'] / perc_imu_semana_anterior) - 1) * 100
-
-            if internacoes_semana_anterior > 0:
-                linha['variacao_internacoes'] = ((linha['internacoes_semana'] / internacoes_semana_anterior) - 1) * 100
-
-        return linha
 
+def gera_dados_semana(evolucao_cidade, evolucao_estado, leitos_estaduais, visao_isolamento, visao_internacoes):
     # cálculo da média da taxa de ocupação de leitos de UTI na semana
+    capital = fatia_visao(visao_internacoes, 'Município de São Paulo')
     leitos = pd.DataFrame()
-    leitos['data'] = internacoes.loc[internacoes.drs == 'Município de São Paulo', 'data'].apply(lambda d: _formata_semana_extenso(_converte_semana(d)))
-    leitos['uti'] = internacoes.loc[internacoes.drs == 'Município de São Paulo', 'ocupacao_leitos_ultimo_dia']
-
-    leitos = leitos.groupby('data').mean().reset_index()
+    leitos['semana'] = _converte_semanas(capital.data)
+    leitos['uti'] = capital.ocupacao_leitos_ultimo_dia
 
-    evolucao_cidade = evolucao_cidade.merge(leitos, on='data', how='outer', suffixes=('_efeito', '_leitos'))
+    leitos = leitos.groupby('semana').mean().reset_index()
 
-    filtro = isolamento.município == 'São Paulo'
-    colunas = ['data', 'isolamento']
+    evolucao_cidade = evolucao_cidade.merge(leitos, on='semana', how='outer', suffixes=('_efeito', '_leitos'))
 
-    isola_atual = isolamento.loc[filtro, colunas]
-    isola_atual['data'] = isola_atual.data.apply(lambda d: _formata_semana_extenso(_converte_semana(d)))
+    isola_atual = fatia_visao(visao_isolamento, 'São Paulo')[['data', 'isolamento']]
+    isola_atual['data'] = _converte_semanas(isola_atual.data)
     isola_atual = isola_atual.groupby('data').mean().reset_index()
-    isola_atual.columns = ['data', 'isolamento_atual']
+    isola_atual.columns = ['semana', 'isolamento_atual']
 
-    evolucao_cidade = evolucao_cidade.merge(isola_atual, on='data', how='left', suffixes=('_efeito', '_isola'))
+    evolucao_cidade = evolucao_cidade.merge(isola_atual, on='semana', how='left', suffixes=('_efeito', '_isola'))
 
-    evolucao_cidade = evolucao_cidade.apply(lambda linha: calcula_variacao(evolucao_cidade, linha), axis=1)
+    evolucao_cidade = evolucao_cidade.sort_values(by='semana').reset_index(drop=True)
+    evolucao_cidade = calcula_variacao(evolucao_cidade)
 
     # dados estaduais
     leitos = pd.DataFrame()
-    leitos['data'] = leitos_estaduais.data.apply(lambda d: _formata_semana_extenso(_converte_semana(d)))
+    leitos['semana'] = _converte_semanas(leitos_estaduais.data)
     leitos['uti'] = leitos_estaduais.sp_uti
 
-    leitos = leitos.groupby('data').mean().reset_index()
+    leitos = leitos.groupby('semana').mean().reset_index()
 
-    evolucao_estado = evolucao_estado.merge(leitos, on='data', how='outer', suffixes=('_efeito', '_leitos'))
+    evolucao_estado = evolucao_estado.merge(leitos, on='semana', how='outer', suffixes=('_efeito', '_leitos'))
 
-    filtro = isolamento.município == 'Estado de São Paulo'
-    colunas = ['data', 'isolamento']
-
-    isola_atual = isolamento.loc[filtro, colunas]
-    isola_atual['data'] = isola_atual.data.apply(lambda d: _formata_semana_extenso(_converte_semana(d)))
+    isola_atual = fatia_visao(visao_isolamento, 'Estado de São Paulo')[['data', 'isolamento']]
+    isola_atual['data'] = _converte_semanas(isola_atual.data)
     isola_atual = isola_atual.groupby('data').mean().reset_index()
-    isola_atual.columns = ['data', 'isolamento_atual']
+    isola_atual.columns = ['semana', 'isolamento_atual']
 
-    evolucao_estado = evolucao_estado.merge(isola_atual, on='data', how='left', suffixes=('_efeito', '_isola'))
+    evolucao_estado = evolucao_estado.merge(isola_atual, on='semana', how='left', suffixes=('_efeito', '_isola'))
 
-    evolucao_estado = evolucao_estado.apply(lambda linha: calcula_variacao(evolucao_estado, linha), axis=1)
+    evolucao_estado = evolucao_estado.sort_values(by='semana').reset_index(drop=True)
+    evolucao_estado = calcula_variacao(evolucao_estado)
 
     return evolucao_cidade, evolucao_estado
 
 
-def gera_graficos(dados_munic, dados_cidade, hospitais_campanha, leitos_municipais, leitos_municipais_privados, leitos_municipais_total, dados_estado, isolamento, leitos_estaduais, evolucao_cidade, evolucao_estado, internacoes, doencas, dados_raciais, dados_vacinacao, dados_imunizantes):
-    # print('\tResumo da campanha de vacinação...')
-    # gera_resumo_vacinacao(dados_vacinacao)
-    print('\tResumo diário...')
-    gera_resumo_diario(dados_munic, dados_cidade, leitos_municipais_total, dados_estado, leitos_estaduais, isolamento, internacoes, dados_vacinacao)
-    print('\tResumo semanal...')
-    gera_resumo_semanal(evolucao_cidade, evolucao_estado)
-    print('\tEvolução da pandemia no estado...')
-    gera_evolucao_estado(evolucao_estado)
-    print('\tEvolução da pandemia na cidade...')
-    gera_evolucao_cidade(evolucao_cidade)
-    print('\tCasos no estado...')
-    gera_casos_estado(dados_estado)
-    print('\tCasos na cidade...')
-    gera_casos_cidade(dados_cidade)
-    print('\tCasos e óbitos estaduais por raça/cor...')
-    gera_casos_obitos_por_raca_cor(dados_raciais)
-    print('\tIsolamento social...')
-    gera_isolamento_grafico(isolamento)
-    print('\tTabela de isolamento social...')
-    gera_isolamento_tabela(isolamento)
-    print('\tLeitos no estado...')
-    gera_leitos_estaduais(leitos_estaduais)
-    print('\tDepartamentos Regionais de Saúde...')
-    gera_drs(internacoes)
-    # print('\tEvolução da campanha de vacinação no estado...')
-    # gera_evolucao_vacinacao_estado(dados_vacinacao)
-    # print('\tEvolução da campanha de vacinação na cidade...')
-    # gera_evolucao_vacinacao_cidade(dados_vacinacao)
-    # print('\tPopulação vacinada...')
-    # gera_populacao_vacinada(dados_vacinacao)
-    # print('\t1ª dose x 2ª dose...')
-    # gera_tipo_doses(dados_vacinacao)
-    # print('\tDoses recebidas x aplicadas...')
-    # gera_doses_aplicadas(dados_vacinacao)
-    # print('\tTabela da campanha de vacinação...')
-    # gera_tabela_vacinacao(dados_vacinacao)
-    # print('\tDistribuição de imunizantes por fabricante...')
-    # gera_distribuicao_imunizantes(dados_imunizantes)
+def gera_graficos(dados, assinaturas):
+    # cada gráfico declara os dados de que precisa e só é refeito se algum deles mudou
+    tarefas = [('Resumo diário', gera_resumo_diario, ('visao_munic', 'dados_cidade', 'leitos_municipais_total', 'visao_estado', 'visao_leitos', 'visao_isolamento', 'visao_internacoes', 'visao_vacinacao')),
+               ('Resumo semanal', gera_resumo_semanal, ('evolucao_cidade', 'evolucao_estado')),
+               ('Evolução da pandemia no estado', gera_evolucao_estado, ('evolucao_estado',)),
+               ('Evolução da pandemia na cidade', gera_evolucao_cidade, ('evolucao_cidade',)),
+               ('Casos no estado', gera_casos_estado, ('dados_estado',)),
+               ('Casos na cidade', gera_casos_cidade, ('dados_cidade',)),
+               ('Casos e óbitos estaduais por raça/cor', gera_casos_obitos_por_raca_cor, ('dados_raciais',)),
+               ('Isolamento social', gera_isolamento_grafico, ('visao_isolamento',)),
+               ('Tabela de isolamento social', gera_isolamento_tabela, ('isolamento',)),
+               ('Leitos no estado', gera_leitos_estaduais, ('leitos_estaduais',)),
+               ('Departamentos Regionais de Saúde', gera_drs, ('visao_internacoes',)),
+               # ('Resumo da campanha de vacinação', gera_resumo_vacinacao, ('dados_vacinacao',)),
+               # ('Evolução da campanha de vacinação no estado', gera_evolucao_vacinacao_estado, ('dados_vacinacao',)),
+               # ('Evolução da campanha de vacinação na cidade', gera_evolucao_vacinacao_cidade, ('dados_vacinacao',)),
+               # ('População vacinada', gera_populacao_vacinada, ('dados_vacinacao',)),
+               # ('1ª dose x 2ª dose', gera_tipo_doses, ('dados_vacinacao',)),
+               # ('Doses recebidas x aplicadas', gera_doses_aplicadas, ('dados_vacinacao',)),
+               # ('Tabela da campanha de vacinação', gera_tabela_vacinacao, ('dados_vacinacao',)),
+               # ('Distribuição de imunizantes por fabricante', gera_distribuicao_imunizantes, ('dados_imunizantes',)),
+               ]
 
     if processa_doencas:
-        print('\tDoenças preexistentes nos casos estaduais...')
-        gera_doencas_preexistentes_casos(doencas)
-        print('\tDoenças preexistentes nos óbitos estaduais...')
-        gera_doencas_preexistentes_obitos(doencas)
+        tarefas.append(('Doenças preexistentes nos casos estaduais', gera_doencas_preexistentes_casos, ('doencas',)))
+        tarefas.append(('Doenças preexistentes nos óbitos estaduais', gera_doencas_preexistentes_obitos, ('doencas',)))
+
+    pendentes = []
+
+    for descricao, funcao, entradas in tarefas:
+        chave = calcula_chave_etapa(funcao, entradas, assinaturas)
+
+        if le_cache_etapa(funcao, chave) is None:
+            pendentes.append((descricao, funcao, tuple(dados[e] for e in entradas), chave))
+        else:
+            print(f'\t{descricao}: sem alterações desde a última execução.')
+
+    erros = {}
+
+    if processos_graficos == 1:
+        for descricao, funcao, argumentos, chave in pendentes:
+            print(f'\t{descricao}...')
+            try:
+                arquivos = executa_grafico(funcao, *argumentos)
+                grava_cache_etapa(funcao, chave, {}, {}, arquivos)
+            except Exception as e:
+                traceback.print_exception(type(e), e, e.__traceback__)
+                erros[descricao] = e
+    elif pendentes:
+        with ProcessPoolExecutor(max_workers=processos_graficos, initializer=inicializa_processo_graficos,
+                                 initargs=(data_processamento, processa_doencas, vacinacao, vacinacao_todos_municipios)) as executor:
+            futuros = {executor.submit(executa_grafico, funcao, *argumentos): (descricao, funcao, chave) for descricao, funcao, argumentos, chave in pendentes}
+
+            for futuro in as_completed(futuros):
+                descricao, funcao, chave = futuros[futuro]
+                try:
+                    arquivos = futuro.result()
+                    grava_cache_etapa(funcao, chave, {}, {}, arquivos)
+                    print(f'\t{descricao}...')
+                except Exception as e:
+                    traceback.print_exception(type(e), e, e.__traceback__)
+                    erros[descricao] = e
+
+    if erros:
+        print('\tErro ao gerar os gráficos:')
+        for descricao, e in erros.items():
+            print(f'\t\t{descricao}: {type(e).__name__}: {e}')
+
+        raise Exception(f'{len(erros)} de {len(tarefas)} gráficos não foram gerados.')
+
+
+def executa_grafico(funcao, *argumentos):
+    # devolve os arquivos gravados pelo gráfico, também quando ele é gerado em outro processo
+    arquivos_gravados.clear()
+    funcao(*argumentos)
+
+    return list(arquivos_gravados)
+
+
+def inicializa_processo_graficos(data, doencas, vacina, todos_municipios):
+    # os processos de geração de gráficos precisam do mesmo estado global do processo principal: com o método
+    # spawn (padrão no macOS e no Windows), eles não herdam as variáveis definidas no __main__
+    global data_processamento, processa_doencas, vacinacao, vacinacao_todos_municipios
+    data_processamento = data
+    processa_doencas = doencas
+    vacinacao = vacina
+    vacinacao_todos_municipios = todos_municipios
+    locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
+
+
+def grava_grafico(fig, nome, versao_mobile):
+    # o gráfico é gravado uma única vez: versao_mobile altera a figura como para a antiga versão mobile e só
+    # as diferenças de layout e de traces são gravadas em window.ajusteMobile, que o app.js aplica com o
+    # Plotly.restyle/relayout quando a página é vista no celular
+    html = gera_html_grafico(fig, nome)
+
+    layout = _achata_atributos(fig.layout.to_plotly_json())
+    traces = [_achata_atributos(trace, inclui_listas=False) for trace in fig._data]
+
+    versao_mobile(fig)
+
+    ajustes = {'layout': _diferencas(layout, _achata_atributos(fig.layout.to_plotly_json())), 'traces': []}
+    grupos = {}
+
+    # traces que recebem as mesmas alterações são atualizados de uma só vez
+    for i, (antes, depois) in enumerate(zip(traces, fig._data)):
+        diferencas = _diferencas(antes, _achata_atributos(depois, inclui_listas=False))
+
+        if diferencas:
+            atualizacao = {atributo: [valor] for atributo, valor in diferencas.items()}
+            grupos.setdefault(pio.json.to_json_plotly(atualizacao), (atualizacao, []))[1].append(i)
+
+    ajustes['traces'] = list(grupos.values())
+    script = f'<script type="text/javascript">window.ajusteMobile = {pio.json.to_json_plotly(ajustes)};</script>'
+    html = html.replace('</body>', script + '\n</body>', 1)
+
+    with open(f'docs/graficos/{nome}.html', 'w', encoding='utf-8') as f:
+        f.write(html)
+
+    registra_arquivo(f'docs/graficos/{nome}.html')
+
+    # gráficos que não são refeitos em toda execução (vacinação, doenças, hospitais de campanha) mantêm o
+    # -mobile.html, usado diretamente pelo app.js; quando um deles é refeito, a versão mobile é atualizada também
+    if os.path.exists(f'docs/graficos/{nome}-mobile.html'):
+        with open(f'docs/graficos/{nome}-mobile.html', 'w', encoding='utf-8') as f:
+            f.write(gera_html_grafico(fig, f'{nome}-mobile'))
+
+        registra_arquivo(f'docs/graficos/{nome}-mobile.html')
+
+
+def gera_html_grafico(fig, nome):
+    # os arrays dos traces (x, y, text...) vão para docs/graficos/dados/<nome>.json; o HTML guarda só a estrutura
+    # da figura e busca as colunas pelo carrega-dados.js
+    figura = fig.to_dict()
+    arquivo = grava_dados_traces(figura['data'], f'dados/{nome}.json')
+
+    html = pio.to_html(figura, include_plotlyjs='directory', auto_play=False, validate=False)
+    html = html.replace('<script src="plotly.min.js"></script>',
+                        '<script src="plotly.min.js"></script>\n        <script src="carrega-dados.js"></script>', 1)
+
+    return html.replace('Plotly.newPlot(', f'montaGrafico("{arquivo}", ', 1)
+
+
+def grava_dados_traces(traces, arquivo):
+    # grava os arrays dos traces em colunas: arrays iguais (ex.: o eixo x compartilhado pelos traces) são gravados
+    # uma única vez e cada trace guarda a posição da coluna de cada atributo. O endereço devolvido (relativo a
+    # docs/graficos) leva o hash do conteúdo, para que o serviceWorker só baixe o arquivo de novo quando os
+    # dados mudarem
+    colunas = {}
+    referencias = []
+
+    for trace in traces:
+        referencias.append({atributo: colunas.setdefault(pio.json.to_json_plotly(valor), len(colunas))
+                            for atributo, valor in _separa_listas(trace).items()})
+
+    conteudo = '{"colunas":[' + ','.join(colunas) + '],"traces":' + pio.json.to_json_plotly(referencias) + '}'
+    versao = hashlib.sha256(conteudo.encode()).hexdigest()[:12]
+
+    os.makedirs(os.path.dirname(f'docs/graficos/{arquivo}'), exist_ok=True)
+
+    with open(f'docs/graficos/{arquivo}', 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+
+    registra_arquivo(f'docs/graficos/{arquivo}')
+
+    return f'{arquivo}?v={versao}'
+
+
+def cria_opcao_grupos(rotulo, grupos, layout, **serie):
+    # opção de menu que mostra só os traces cujo meta está em grupos, em vez de uma lista de visibilidade com todos
+    # os traces em cada opção. Com o method 'skip' o Plotly não altera o gráfico e o carrega-dados.js trata o
+    # clique; se serie tiver um arquivo, ele é carregado antes no trace indicado
+    return dict(label=rotulo, method='skip', args=[dict(grupos=grupos, **serie), layout])
+
+
+def cria_botao_animacao(traces, duracao):
+    # as séries vão uma única vez no gráfico e o carrega-dados.js monta os quadros da animação no navegador,
+    # revelando um ponto de cada trace por quadro (duracao em milissegundos)
+    return dict(label='Animar', method='skip', args=[dict(animar=traces, duracao=duracao)])
+
+
+def nome_arquivo(nome):
+    # 'São João da Boa Vista' -> 'sao-joao-da-boa-vista'
+    nome = ''.join(c for c in unicodedata.normalize('NFD', nome.lower()) if unicodedata.category(c) != 'Mn')
+    return '-'.join(''.join(c if c.isalnum() else ' ' for c in nome).split())
+
+
+def _separa_listas(atributos, prefixo=''):
+    # retira dos atributos (aninhados) os valores que são listas ou arrays, devolvidos em notação com pontos
+    listas = {}
+
+    for chave, valor in list(atributos.items()):
+        if isinstance(valor, dict):
+            listas.update(_separa_listas(valor, f'{prefixo}{chave}.'))
+        elif isinstance(valor, (list, tuple, np.ndarray, pd.Series, pd.Index)):
+            listas[f'{prefixo}{chave}'] = atributos.pop(chave)
+
+    return listas
+
+
+def _achata_atributos(atributos, prefixo='', inclui_listas=True):
+    # atributos aninhados em notação com pontos ('xaxis.nticks'), como o Plotly.relayout/restyle espera;
+    # listas e arrays são valores inteiros (ex.: annotations) e, nos traces, ficam de fora (são os dados)
+    achatados = {}
+
+    for chave, valor in atributos.items():
+        if isinstance(valor, dict) and valor:
+            achatados.update(_achata_atributos(valor, f'{prefixo}{chave}.', inclui_listas))
+        elif inclui_listas or not isinstance(valor, (list, tuple, np.ndarray, pd.Series, pd.Index)):
+            achatados[f'{prefixo}{chave}'] = valor
+
+    return achatados
+
+
+def _diferencas(antes, depois):
+    # atributos novos ou alterados, e None para os removidos (o Plotly volta ao valor padrão)
+    diferencas = {chave: valor for chave, valor in depois.items()
+                  if chave not in antes or pio.json.to_json_plotly(antes[chave]) != pio.json.to_json_plotly(valor)}
+    diferencas.update({chave: None for chave in antes if chave not in depois})
+
+    return diferencas
 
 
 def gera_resumo_vacinacao(dados_vacinacao):
@@ -1207,22 +2205,21 @@ def gera_resumo_vacinacao(dados_vacinacao):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/resumo-vacinacao.html', include_plotlyjs='directory', auto_open=False)
-
-    fig.update_layout(
-        font=dict(size=13, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=30, pad=5),
-        annotations=[dict(x=0, y=0)],
-        height=620
-    )
-
-    # fig.show()
+    # versão mobile
+    def versao_mobile(fig):
+        fig.update_layout(
+            font=dict(size=13, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=30, pad=5),
+            annotations=[dict(x=0, y=0)],
+            height=620
+        )
 
-    pio.write_html(fig, file='docs/graficos/resumo-vacinacao-mobile.html', include_plotlyjs='directory', auto_open=False)
+    grava_grafico(fig, 'resumo-vacinacao', versao_mobile)
 
 
-def gera_resumo_diario(dados_munic, dados_cidade, leitos_municipais, dados_estado, leitos_estaduais, isolamento, internacoes, dados_vacinacao):
-    hoje = data_processamento
+def gera_resumo_diario(visao_munic, dados_cidade, leitos_municipais, visao_estado, visao_leitos, visao_isolamento, visao_internacoes, visao_vacinacao):
+    hoje = data_processamento.date()
+    ontem = hoje - timedelta(days=1)
 
     cabecalho = ['<b>Resumo diário</b>',
                  '<b>Estado de SP</b><br><i>' + hoje.strftime('%d/%m/%Y') + '</i>',
@@ -1231,38 +2228,34 @@ def gera_resumo_diario(dados_munic, dados_cidade, leitos_municipais, dados_estad
     info = ['<b>Vacinadas</b>', '<b>Casos</b>', '<b>Casos no dia</b>', '<b>Óbitos</b>', '<b>Óbitos no dia</b>',
             '<b>Letalidade</b>', '<b>Leitos Covid-19</b>', '<b>Internados UTI</b>', '<b>Ocupação de UTIs</b>', '<b>Isolamento</b>']
 
-    filtro = (isolamento.município == 'Estado de São Paulo') & (isolamento.data.dt.date == hoje.date() - timedelta(days=1))
-    isolamento_atual = isolamento.loc[filtro, 'isolamento']
+    isolamento_atual = valor_visao(visao_isolamento, ontem, 'isolamento', 'Estado de São Paulo')
     isolamento_atual = 'indisponível' if isolamento_atual.empty else f'{isolamento_atual.item():7.0f}%'.replace('.', ',')
 
-    filtro = (dados_vacinacao.municipio == 'ESTADO DE SAO PAULO') & (dados_vacinacao.data.dt.date == hoje.date())
-    vacinadas = dados_vacinacao.loc[filtro, 'aplicadas_dia']
+    vacinadas = valor_visao(visao_vacinacao, hoje, 'aplicadas_dia', 'ESTADO DE SAO PAULO')
     vacinadas = 'indisponível' if vacinadas.empty else f'{vacinadas.item():7,.0f}'.replace(',', '.')
 
-    filtro = (dados_estado.data.dt.date == hoje.date())
-
-    total_casos = dados_estado.loc[filtro, 'total_casos']
+    total_casos = valor_visao(visao_estado, hoje, 'total_casos')
     total_casos = 'indisponível' if total_casos.empty else f'{total_casos.item():7,.0f}'.replace(',', '.')
 
-    casos_dia = dados_estado.loc[filtro, 'casos_dia']
+    casos_dia = valor_visao(visao_estado, hoje, 'casos_dia')
     casos_dia = 'indisponível' if casos_dia.empty else f'{casos_dia.item():7,.0f}'.replace(',', '.')
 
-    total_obitos = dados_estado.loc[filtro, 'total_obitos']
+    total_obitos = valor_visao(visao_estado, hoje, 'total_obitos')
     total_obitos = 'indisponível' if total_obitos.empty else f'{total_obitos.item():7,.0f}'.replace(',', '.')
 
-    obitos_dia = dados_estado.loc[filtro, 'obitos_dia']
+    obitos_dia = valor_visao(visao_estado, hoje, 'obitos_dia')
     obitos_dia = 'indisponível' if obitos_dia.empty else f'{obitos_dia.item():7,.0f}'.replace(',', '.')
 
-    letalidade_atual = dados_estado.loc[filtro, 'letalidade']
+    letalidade_atual = valor_visao(visao_estado, hoje, 'letalidade')
     letalidade_atual = 'indisponível' if letalidade_atual.empty else f'{letalidade_atual.item():7.2f}%'.replace('.', ',')
 
-    leitos_covid = internacoes.loc[(internacoes.drs == 'Estado de São Paulo') & (internacoes.data.dt.date == hoje.date()), 'total_covid_uti_ultimo_dia']
+    leitos_covid = valor_visao(visao_internacoes, hoje, 'total_covid_uti_ultimo_dia', 'Estado de São Paulo')
     leitos_covid = 'indisponível' if leitos_covid.empty else f'{leitos_covid.item():7,.0f}'.replace(',', '.')
 
-    internacoes_dia = internacoes.loc[(internacoes.drs == 'Estado de São Paulo') & (internacoes.data.dt.date == hoje.date()), 'pacientes_uti_ultimo_dia']
+    internacoes_dia = valor_visao(visao_internacoes, hoje, 'pacientes_uti_ultimo_dia', 'Estado de São Paulo')
     internacoes_dia = 'indisponível' if internacoes_dia.empty else f'{internacoes_dia.item():7,.0f}'.replace(',', '.')
 
-    ocupacao_uti = leitos_estaduais.loc[leitos_estaduais.data.dt.date == hoje.date(), 'sp_uti']
+    ocupacao_uti = valor_visao(visao_leitos, hoje, 'sp_uti')
     ocupacao_uti = 'indisponível' if ocupacao_uti.empty else f'{ocupacao_uti.item():7.1f}%'.replace('.', ',')
 
     estado = [vacinadas,
@@ -1276,38 +2269,34 @@ def gera_resumo_diario(dados_munic, dados_cidade, leitos_municipais, dados_estad
               ocupacao_uti,
               isolamento_atual]
 
-    filtro = (isolamento.município == 'São Paulo') & (isolamento.data.dt.date == hoje.date() - timedelta(days=1))
-    isolamento_atual = isolamento.loc[filtro, 'isolamento']
+    isolamento_atual = valor_visao(visao_isolamento, ontem, 'isolamento', 'São Paulo')
     isolamento_atual = 'indisponível' if isolamento_atual.empty else f'{isolamento_atual.item():7.0f}%'.replace('.', ',')
 
-    filtro = (dados_vacinacao.municipio == 'SAO PAULO') & (dados_vacinacao.data.dt.date == hoje.date())
-    vacinadas = dados_vacinacao.loc[filtro, 'aplicadas_dia']
+    vacinadas = valor_visao(visao_vacinacao, hoje, 'aplicadas_dia', 'SAO PAULO')
     vacinadas = 'indisponível' if vacinadas.empty else f'{vacinadas.item():7,.0f}'.replace(',', '.')
 
-    filtro = (dados_munic.nome_munic == 'São Paulo') & (dados_munic.datahora.dt.date == hoje.date())
-
-    total_casos = dados_munic.loc[filtro, 'casos']
+    total_casos = valor_visao(visao_munic, hoje, 'casos', 'São Paulo')
     total_casos = 'indisponível' if total_casos.empty else f'{total_casos.item():7,.0f}'.replace(',', '.')
 
-    casos_dia = dados_munic.loc[filtro, 'casos_novos']
+    casos_dia = valor_visao(visao_munic, hoje, 'casos_dia', 'São Paulo')
     casos_dia = 'indisponível' if casos_dia.empty else f'{casos_dia.item():7,.0f}'.replace(',', '.')
 
-    total_obitos = dados_munic.loc[filtro, 'obitos']
+    total_obitos = valor_visao(visao_munic, hoje, 'obitos', 'São Paulo')
     total_obitos = 'indisponível' if total_obitos.empty else f'{total_obitos.item():7,.0f}'.replace(',', '.')
 
-    obitos_dia = dados_munic.loc[filtro, 'obitos_novos']
+    obitos_dia = valor_visao(visao_munic, hoje, 'obitos_dia', 'São Paulo')
     obitos_dia = 'indisponível' if obitos_dia.empty else f'{obitos_dia.item():7,.0f}'.replace(',', '.')
 
-    letalidade_atual = dados_munic.loc[filtro, 'letalidade']
+    letalidade_atual = valor_visao(visao_munic, hoje, 'letalidade', 'São Paulo')
     letalidade_atual = 'indisponível' if letalidade_atual.empty else f'{letalidade_atual.item():7.2f}%'.replace('.', ',')
 
-    leitos_covid = internacoes.loc[(internacoes.drs == 'Município de São Paulo') & (internacoes.data.dt.date == hoje.date()), 'total_covid_uti_ultimo_dia']
+    leitos_covid = valor_visao(visao_internacoes, hoje, 'total_covid_uti_ultimo_dia', 'Município de São Paulo')
     leitos_covid = 'indisponível' if leitos_covid.empty else f'{leitos_covid.item():7,.0f}'.replace(',', '.')
 
-    internacoes_dia = internacoes.loc[(internacoes.drs == 'Município de São Paulo') & (internacoes.data.dt.date == hoje.date()), 'pacientes_uti_ultimo_dia']
+    internacoes_dia = valor_visao(visao_internacoes, hoje, 'pacientes_uti_ultimo_dia', 'Município de São Paulo')
     internacoes_dia = 'indisponível' if internacoes_dia.empty else f'{internacoes_dia.item():7,.0f}'.replace(',', '.')
 
-    ocupacao_uti = internacoes.loc[(internacoes.drs == 'Município de São Paulo') & (internacoes.data.dt.date == hoje.date()), 'ocupacao_leitos_ultimo_dia']
+    ocupacao_uti = valor_visao(visao_internacoes, hoje, 'ocupacao_leitos_ultimo_dia', 'Município de São Paulo')
     ocupacao_uti = 'indisponível' if ocupacao_uti.empty else f'{ocupacao_uti.item():7.1f}%'.replace('.', ',')
 
     cidade = [vacinadas,
@@ -1343,18 +2332,16 @@ def gera_resumo_diario(dados_munic, dados_cidade, leitos_municipais, dados_estad
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/resumo.html', include_plotlyjs='directory', auto_open=False)
-
-    fig.update_layout(
-        font=dict(size=13, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=30, pad=5),
-        annotations=[dict(x=0, y=0)],
-        height=430
-    )
-
-    # fig.show()
+    # versão mobile
+    def versao_mobile(fig):
+        fig.update_layout(
+            font=dict(size=13, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=30, pad=5),
+            annotations=[dict(x=0, y=0)],
+            height=430
+        )
 
-    pio.write_html(fig, file='docs/graficos/resumo-mobile.html', include_plotlyjs='directory', auto_open=False)
+    grava_grafico(fig, 'resumo', versao_mobile)
 
 
 def _formata_variacao(v, retorna_texto=False):
@@ -1383,7 +2370,7 @@ def gera_resumo_semanal(evolucao_cidade, evolucao_estado):
     hoje = data_processamento
     hoje_formatado = _formata_semana_ordinal(hoje)
 
-    # %U: semana começa no domingo
+    # semana epidemiológica: começa no domingo
     hoje = data_processamento - timedelta(days=1)
     semana = _formata_semana_extenso(_converte_semana(hoje), inclui_ano=False)
 
@@ -1391,8 +2378,6 @@ def gera_resumo_semanal(evolucao_cidade, evolucao_estado):
                  f'<b>Estado de SP</b><br>{semana}',
                  f'<b>Cidade de SP</b><br>{semana}']
 
-    semana = _formata_semana_extenso(_converte_semana(hoje), inclui_ano=True)
-
     info = ['<b>Vacinadas</b>', '<b>Variação</b>',
             '<b>Casos</b>', '<b>Variação</b>',
             '<b>Óbitos</b>', '<b>Variação</b>',
@@ -1400,7 +2385,7 @@ def gera_resumo_semanal(evolucao_cidade, evolucao_estado):
             '<b>Ocupação de UTIs</b>', '<b>Variação</b>',
             '<b>Isolamento</b>', '<b>Variação</b>']
 
-    num_semana = evolucao_estado.index[evolucao_estado.data == semana].item()
+    num_semana = evolucao_estado.index[evolucao_estado.semana == _converte_semana(hoje)].item()
 
     vacinadas_semana = evolucao_estado.loc[num_semana, 'vacinadas_semana']
     vacinadas_semana = 'indisponível' if isnan(vacinadas_semana) else f'{vacinadas_semana.item():7,.0f}'.replace(',', '.')
@@ -1433,7 +2418,7 @@ def gera_resumo_semanal(evolucao_cidade, evolucao_estado):
               isolamento_atual, # Isolamento social
               '<i>' + _formata_variacao(evolucao_estado.loc[num_semana, 'variacao_isolamento'], retorna_texto=True) + '</i>']  # Variação isolamento
 
-    num_semana = evolucao_cidade.index[evolucao_cidade.data == semana].item()
+    num_semana = evolucao_cidade.index[evolucao_cidade.semana == _converte_semana(hoje)].item()
 
     vacinadas_semana = evolucao_cidade.loc[num_semana, 'vacinadas_semana']
     vacinadas_semana = 'indisponível' if isnan(vacinadas_semana) else f'{vacinadas_semana.item():7,.0f}'.replace(',', '.')
@@ -1488,18 +2473,16 @@ def gera_resumo_semanal(evolucao_cidade, evolucao_estado):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/resumo-semanal.html', include_plotlyjs='directory', auto_open=False)
-
-    fig.update_layout(
-        font=dict(size=13, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=30, pad=5),
-        annotations=[dict(x=0, y=0)],
-        height=495
-    )
-
-    # fig.show()
+    # versão mobile
+    def versao_mobile(fig):
+        fig.update_layout(
+            font=dict(size=13, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=30, pad=5),
+            annotations=[dict(x=0, y=0)],
+            height=495
+        )
 
-    pio.write_html(fig, file='docs/graficos/resumo-semanal-mobile.html', include_plotlyjs='directory', auto_open=False)
+    grava_grafico(fig, 'resumo-semanal', versao_mobile)
 
 
 def gera_casos_estado(dados):
@@ -1538,25 +2521,20 @@ def gera_casos_estado(dados):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/casos-estado.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(selector=dict(type='scatter'), mode='lines')
+    def versao_mobile(fig):
+        fig.update_traces(selector=dict(type='scatter'), mode='lines')
 
-    fig.update_xaxes(nticks=10)
-
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/casos-estado-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'casos-estado', versao_mobile)
 
 
 def gera_casos_cidade(dados):
@@ -1593,62 +2571,43 @@ def gera_casos_cidade(dados):
     fig.update_yaxes(title_text='Número de casos ou óbitos', secondary_y=False)
     fig.update_yaxes(title_text='Taxa de letalidade (%)', secondary_y=True)
 
-    # fig.show()
+    # fig.show()
+
+    # versão mobile
+    def versao_mobile(fig):
+        fig.update_traces(selector=dict(type='scatter'), mode='lines')
+
+        fig.update_xaxes(nticks=10)
+
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=20),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/casos-cidade.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'casos-cidade', versao_mobile)
 
-    # versão mobile
-    fig.update_traces(selector=dict(type='scatter'), mode='lines')
 
-    fig.update_xaxes(nticks=10)
+def gera_doencas_preexistentes_casos(doencas):
+    idades, codigos, cubo = monta_cubo_doencas(doencas)
+    casos = cubo.sum(axis=0)  # todos os casos confirmados: (sexo, idade, código)
 
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=20),
-        height=400
-    )
+    ignorados = conta_doencas(casos, codigos, **{d: 'IGNORADO' for d in DOENCAS})
+    sem_doencas = conta_doencas(casos, codigos, **{d: 'NÃO' for d in DOENCAS})
+    com_doencas = distribui_por_doenca(casos, codigos)[..., ESTADOS_DOENCA['SIM']]  # (sexo, idade, doença)
 
-    # fig.show()
+    feminino = SEXOS_DOENCAS.index('FEMININO')
+    masculino = SEXOS_DOENCAS.index('MASCULINO')
 
-    pio.write_html(fig, file='docs/graficos/casos-cidade-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    casos_ignorados_m = ignorados[feminino].tolist()
+    casos_ignorados_h = ignorados[masculino].tolist()
 
+    casos_sem_doencas_m = sem_doencas[feminino].tolist()
+    casos_sem_doencas_h = sem_doencas[masculino].tolist()
 
-def gera_doencas_preexistentes_casos(doencas):
-    idades = list(doencas.reset_index('idade').idade.unique())
-
-    casos_ignorados_m = [doencas.xs(('CONFIRMADO', 'FEMININO', i, 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                     'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                     'IGNORADO', 'IGNORADO'), level=('covid19', 'sexo', 'idade', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                     'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                     'sindrome_de_down')).asma.sum() for i in idades]
-    casos_ignorados_h = [doencas.xs(('CONFIRMADO', 'MASCULINO', i, 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                     'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                     'IGNORADO', 'IGNORADO'), level=('covid19', 'sexo', 'idade', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                     'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                     'sindrome_de_down')).asma.sum() for i in idades]
-
-    casos_sem_doencas_m = [doencas.xs(('CONFIRMADO', 'FEMININO', i, 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO',
-                                       'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO'), level=('covid19', 'sexo', 'idade', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                       'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                       'sindrome_de_down')).asma.sum() for i in idades]
-    casos_sem_doencas_h = [doencas.xs(('CONFIRMADO', 'MASCULINO', i, 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO',
-                                       'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO'), level=('covid19', 'sexo', 'idade', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                       'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                       'sindrome_de_down')).asma.sum() for i in idades]
-
-    casos_com_doencas_m = []
-    casos_com_doencas_h = []
-
-    for d in doencas.columns:
-        casos_com_doencas_m.append(
-            [doencas.xs(('CONFIRMADO', 'FEMININO', i, 'SIM'), level=('covid19', 'sexo', 'idade', d))[d].sum() for i in
-             idades])
-        casos_com_doencas_h.append(
-            [doencas.xs(('CONFIRMADO', 'MASCULINO', i, 'SIM'), level=('covid19', 'sexo', 'idade', d))[d].sum() for i in
-             idades])
+    casos_com_doencas_m = com_doencas[feminino].T.tolist()
+    casos_com_doencas_h = com_doencas[masculino].T.tolist()
 
     # para os dados femininos, todos os valores precisam ser negativados
     casos_ignorados_m_neg = [-valor for valor in casos_ignorados_m]
@@ -1665,14 +2624,14 @@ def gera_doencas_preexistentes_casos(doencas):
     for lista_m in casos_com_doencas_m_neg:
         fig.add_trace(go.Bar(x=lista_m, y=idades, orientation='h',
                              hoverinfo='text+y+name', text=casos_com_doencas_m[cont],
-                             marker_color='red', name=doencas.columns[cont], visible=True))
+                             marker_color='red', name=DOENCAS[cont], visible=True))
         cont = cont + 1
 
     cont = 0
 
     for lista_h in casos_com_doencas_h:
         fig.add_trace(go.Bar(x=lista_h, y=idades, orientation='h', hoverinfo='x+y+name',
-                             marker_color='blue', name=doencas.columns[cont], visible=True))
+                             marker_color='blue', name=DOENCAS[cont], visible=True))
         cont = cont + 1
 
     fig.add_trace(go.Bar(x=casos_sem_doencas_m_neg, y=idades, orientation='h',
@@ -1706,55 +2665,38 @@ def gera_doencas_preexistentes_casos(doencas):
 
     fig.update_yaxes(range=[0, 105], tickvals=[*range(0, 105, 5)])
 
-    pio.write_html(fig, file='docs/graficos/doencas-casos.html', include_plotlyjs='directory',
-                   auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_yaxes(range=[0, 105], tickvals=[*range(0, 105, 10)])
+    def versao_mobile(fig):
+        fig.update_yaxes(range=[0, 105], tickvals=[*range(0, 105, 10)])
 
-    fig.update_layout(
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_layout(
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/doencas-casos-mobile.html', include_plotlyjs='directory',
-                   auto_open=False, auto_play=False)
+    grava_grafico(fig, 'doencas-casos', versao_mobile)
 
 
 def gera_doencas_preexistentes_obitos(doencas):
-    idades = list(doencas.reset_index('idade').idade.unique())
-
-    obitos_ignorados_m = [doencas.xs(('CONFIRMADO', 'FEMININO', i, 1, 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                      'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                      'IGNORADO', 'IGNORADO', 'IGNORADO'), level=('covid19', 'sexo', 'idade', 'obito', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                      'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                      'sindrome_de_down')).asma.sum() for i in idades]
-    obitos_ignorados_h = [doencas.xs(('CONFIRMADO', 'MASCULINO', i, 1, 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                      'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO', 'IGNORADO',
-                                      'IGNORADO', 'IGNORADO', 'IGNORADO'), level=('covid19', 'sexo', 'idade', 'obito', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                      'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                      'sindrome_de_down')).asma.sum() for i in idades]
-
-    obitos_sem_doencas_m = [doencas.xs(('CONFIRMADO', 'FEMININO', i, 1, 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO',
-                                        'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO'), level=('covid19', 'sexo', 'idade', 'obito', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                        'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                        'sindrome_de_down')).asma.sum() for i in idades]
-    obitos_sem_doencas_h = [doencas.xs(('CONFIRMADO', 'MASCULINO', i, 1, 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO',
-                                       'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO', 'NÃO'), level=('covid19', 'sexo', 'idade', 'obito', 'asma', 'cardiopatia', 'diabetes', 'doenca_hematologica', 'doenca_hepatica',
-                                       'doenca_neurologica', 'doenca_renal', 'imunodepressao', 'obesidade', 'outros', 'pneumopatia', 'puerpera',
-                                       'sindrome_de_down')).asma.sum() for i in idades]
-
-    obitos_com_doencas_m = []
-    obitos_com_doencas_h = []
-
-    for d in doencas.columns:
-        obitos_com_doencas_m.append([doencas.xs(('CONFIRMADO', 'FEMININO', i, 1, 'SIM'),
-                                                level=('covid19', 'sexo', 'idade', 'obito', d))[d].sum() for i in
-                                     idades])
-        obitos_com_doencas_h.append([doencas.xs(('CONFIRMADO', 'MASCULINO', i, 1, 'SIM'),
-                                                level=('covid19', 'sexo', 'idade', 'obito', d))[d].sum() for i in
-                                     idades])
+    idades, codigos, cubo = monta_cubo_doencas(doencas)
+    obitos = cubo[1]  # somente os óbitos: (sexo, idade, código)
+
+    ignorados = conta_doencas(obitos, codigos, **{d: 'IGNORADO' for d in DOENCAS})
+    sem_doencas = conta_doencas(obitos, codigos, **{d: 'NÃO' for d in DOENCAS})
+    com_doencas = distribui_por_doenca(obitos, codigos)[..., ESTADOS_DOENCA['SIM']]  # (sexo, idade, doença)
+
+    feminino = SEXOS_DOENCAS.index('FEMININO')
+    masculino = SEXOS_DOENCAS.index('MASCULINO')
+
+    obitos_ignorados_m = ignorados[feminino].tolist()
+    obitos_ignorados_h = ignorados[masculino].tolist()
+
+    obitos_sem_doencas_m = sem_doencas[feminino].tolist()
+    obitos_sem_doencas_h = sem_doencas[masculino].tolist()
+
+    obitos_com_doencas_m = com_doencas[feminino].T.tolist()
+    obitos_com_doencas_h = com_doencas[masculino].T.tolist()
 
     # para os dados femininos, todos os valores precisam ser negativados
     obitos_ignorados_m_neg = [-valor for valor in obitos_ignorados_m]
@@ -1771,14 +2713,14 @@ def gera_doencas_preexistentes_obitos(doencas):
     for lista_m in obitos_com_doencas_m_neg:
         fig.add_trace(go.Bar(x=lista_m, y=idades, orientation='h',
                              hoverinfo='text+y+name', text=obitos_com_doencas_m[cont],
-                             marker_color='red', name=doencas.columns[cont], visible=True))
+                             marker_color='red', name=DOENCAS[cont], visible=True))
         cont = cont + 1
 
     cont = 0
 
     for lista_h in obitos_com_doencas_h:
         fig.add_trace(go.Bar(x=lista_h, y=idades, orientation='h', hoverinfo='x+y+name',
-                             marker_color='blue', name=doencas.columns[cont], visible=True))
+                             marker_color='blue', name=DOENCAS[cont], visible=True))
         cont = cont + 1
 
     fig.add_trace(go.Bar(x=obitos_sem_doencas_m_neg, y=idades, orientation='h',
@@ -1812,20 +2754,17 @@ def gera_doencas_preexistentes_obitos(doencas):
 
     fig.update_yaxes(range=[0, 105], tickvals=[*range(0, 105, 5)])
 
-    pio.write_html(fig, file='docs/graficos/doencas-obitos.html', include_plotlyjs='directory',
-                   auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_yaxes(range=[0, 105], tickvals=[*range(0, 105, 10)])
+    def versao_mobile(fig):
+        fig.update_yaxes(range=[0, 105], tickvals=[*range(0, 105, 10)])
 
-    fig.update_layout(
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_layout(
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/doencas-obitos-mobile.html', include_plotlyjs='directory',
-                   auto_open=False, auto_play=False)
+    grava_grafico(fig, 'doencas-obitos', versao_mobile)
 
 
 def gera_casos_obitos_por_raca_cor(dados_raciais):
@@ -1866,66 +2805,62 @@ def gera_casos_obitos_por_raca_cor(dados_raciais):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/raca-cor.html', include_plotlyjs='directory',
-                   auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_layout(
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+    def versao_mobile(fig):
+        fig.update_layout(
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/raca-cor-mobile.html', include_plotlyjs='directory',
-                   auto_open=False, auto_play=False)
+    grava_grafico(fig, 'raca-cor', versao_mobile)
 
 
-def gera_isolamento_grafico(isolamento):
+def gera_isolamento_grafico(visao_isolamento):
+    isolamento = visao_isolamento['dados']
     fig = go.Figure()
 
     # lista de municípios em ordem de maior índice de isolamento
     l_municipios = list(
         isolamento.sort_values(by=['data', 'isolamento', 'município'], ascending=False).município.unique())
 
-    # series em vez de list, para que seja possível utilizar o método isin
-    s_municipios = pd.Series(l_municipios)
-
     titulo_a = 'Índice de adesão ao isolamento social - '
     titulo_b = '<br><i>Fonte: <a href = "https://www.saopaulo.sp.gov.br/coronavirus/isolamento/">Governo do Estado de São Paulo</a></i>'
 
     cidades_iniciais = ['Estado de São Paulo', 'São Paulo', 'Guarulhos', 'Osasco', 'Jundiaí', 'Caieiras',
                         'Campinas', 'Santo André', 'Mauá', 'Francisco Morato', 'Poá']
 
-    for m in l_municipios:
-        grafico = isolamento[isolamento.município == m]
+    series = divide_por_entidade(visao_isolamento,
+                                 isolamento[['dia', 'isolamento']].assign(texto=isolamento.isolamento.astype(str) + '%'))
 
-        if m in cidades_iniciais:
-            fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['isolamento'], name=m,
-                                     mode='lines+markers', hovertemplate='%{y:.0f}%', visible=True))
-        else:
-            fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['isolamento'], name=m,
-                                     mode='lines+markers+text', textposition='top center',
-                                     text=grafico['isolamento'].apply(lambda i: str(i) + '%'),
-                                     hovertemplate='%{y:.0f}%', visible=False))
+    # só as cidades iniciais vão no HTML; a série de cada um dos demais municípios é gravada em um arquivo
+    # próprio, que o carrega-dados.js busca e coloca no último trace quando o município é escolhido no menu
+    l_iniciais = [m for m in l_municipios if m in cidades_iniciais]
 
-    opcao_metro = dict(label='Região Metropolitana',
-                       method='update',
-                       args=[{'visible': s_municipios.isin(cidades_iniciais)},
-                             {'title.text': titulo_a + 'Região Metropolitana' + titulo_b},
-                             {'showlegend': True}])
+    for i, m in enumerate(l_iniciais):
+        grafico = series[m]
+        fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['isolamento'], name=m,
+                                 mode='lines+markers', hovertemplate='%{y:.0f}%', meta=i, visible=True))
 
-    opcao_estado = dict(label='Estado de São Paulo',
-                        method='update',
-                        args=[{'visible': s_municipios.isin(['Estado de São Paulo'])},
-                              {'title.text': titulo_a + 'Estado de São Paulo' + titulo_b},
-                              {'showlegend': False}])
+    fig.add_trace(go.Scatter(mode='lines+markers+text', textposition='top center',
+                             hovertemplate='%{y:.0f}%', meta=len(l_iniciais), visible=False))
+
+    opcao_metro = cria_opcao_grupos('Região Metropolitana', list(range(len(l_iniciais))),
+                                    {'title.text': titulo_a + 'Região Metropolitana' + titulo_b})
+
+    opcao_estado = cria_opcao_grupos('Estado de São Paulo', [l_iniciais.index('Estado de São Paulo')],
+                                     {'title.text': titulo_a + 'Estado de São Paulo' + titulo_b})
 
     def cria_lista_opcoes(cidade):
-        return dict(label=cidade,
-                    method='update',
-                    args=[{'visible': s_municipios.isin([cidade])},
-                          {'title.text': titulo_a + cidade + titulo_b},
-                          {'showlegend': False}])
+        if cidade in cidades_iniciais:
+            return cria_opcao_grupos(cidade, [l_iniciais.index(cidade)], {'title.text': titulo_a + cidade + titulo_b})
+
+        grafico = series[cidade]
+        trace = go.Scatter(x=grafico['dia'], y=grafico['isolamento'], text=grafico['texto']).to_plotly_json()
+        arquivo = grava_dados_traces([trace], f'dados/isolamento/{nome_arquivo(cidade)}.json')
+
+        return cria_opcao_grupos(cidade, [len(l_iniciais)], {'title.text': titulo_a + cidade + titulo_b},
+                                 arquivo=arquivo, trace=len(l_iniciais), name=cidade)
 
     fig.update_layout(
         font=dict(family='Roboto'),
@@ -1936,32 +2871,36 @@ def gera_isolamento_grafico(isolamento):
         hoverlabel={'namelength': -1},  # para não truncar o nome de cada trace no hover
         template='plotly',
         updatemenus=[go.layout.Updatemenu(active=0,
-                                          buttons=[opcao_metro, opcao_estado] + list(
-                                              s_municipios.apply(lambda m: cria_lista_opcoes(m))),
+                                          buttons=[opcao_metro, opcao_estado] + [cria_lista_opcoes(m)
+                                                                                 for m in l_municipios],
                                           x=0.001, xanchor='left',
                                           y=0.990, yanchor='top')],
         height=600
     )
 
-    # fig.show()
+    # arquivos de municípios que não estão mais nos dados (ex.: renomeados) deixam de ser publicados
+    diretorio = 'docs/graficos/dados/isolamento'
+    referenciados = {f'{nome_arquivo(m)}.json' for m in l_municipios if m not in cidades_iniciais}
 
-    pio.write_html(fig, file='docs/graficos/isolamento.html', include_plotlyjs='directory', auto_open=False)
+    for arquivo in set(os.listdir(diretorio) if os.path.isdir(diretorio) else []) - referenciados:
+        os.remove(f'{diretorio}/{arquivo}')
 
-    # versão mobile
-    fig.update_traces(mode='lines+text')
+    # fig.show()
 
-    fig.update_xaxes(nticks=10)
+    # versão mobile
+    def versao_mobile(fig):
+        fig.update_traces(mode='lines+text')
 
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/isolamento-mobile.html', include_plotlyjs='directory', auto_open=False)
+    grava_grafico(fig, 'isolamento', versao_mobile)
 
 
 def gera_isolamento_tabela(isolamento):
@@ -1994,25 +2933,23 @@ def gera_isolamento_tabela(isolamento):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/tabela-isolamento.html', include_plotlyjs='directory', auto_open=False)
-
-    fig.update_layout(
-        font=dict(size=13, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=30, pad=5),
-        annotations=[dict(x=0, y=1.05)],
-        height=400
-    )
-
-    # fig.show()
+    # versão mobile
+    def versao_mobile(fig):
+        fig.update_layout(
+            font=dict(size=13, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=30, pad=5),
+            annotations=[dict(x=0, y=1.05)],
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/tabela-isolamento-mobile.html', include_plotlyjs='directory',
-                   auto_open=False)
+    grava_grafico(fig, 'tabela-isolamento', versao_mobile)
 
 
 def gera_evolucao_estado(evolucao_estado):
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
-    grafico = evolucao_estado
+    grafico = evolucao_estado.copy()
+    grafico['data'] = grafico.semana.apply(lambda s: _formata_semana_extenso(s))
 
     fig.add_trace(go.Scatter(x=grafico['data'], y=grafico['isolamento'], line=dict(color='orange'),
                              name='isolamento médio<br>de 2 semanas atrás', hovertemplate='%{y:.2f}%',
@@ -2048,22 +2985,7 @@ def gera_evolucao_estado(evolucao_estado):
                          marker_color='green', textposition='outside', name='novas internações<br>na semana atual',
                          text=grafico['variacao_internacoes'].apply(lambda v: _formata_variacao(v))))
 
-    d = grafico.data.size
-
-    frames = [dict(data=[dict(type='scatter', x=grafico.data[:d + 1], y=grafico.isolamento[:d + 1]),
-                         dict(type='scatter', x=grafico.data[:d + 1], y=grafico.uti[:d + 1]),
-                         dict(type='scatter', x=grafico.data[:d + 1], y=grafico.perc_imu_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.casos_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.obitos_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.vacinadas_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.internacoes_semana[:d + 1])],
-                   traces=[0, 1, 2, 3, 4, 5, 6],
-                   ) for d in range(0, d)]
-
-    fig.frames = frames
-
-    botoes = [dict(label='Animar', method='animate',
-                   args=[None, dict(frame=dict(duration=400, redraw=True), fromcurrent=True, mode='immediate')])]
+    botoes = [cria_botao_animacao([0, 1, 2, 3, 4, 5, 6], 400)]
 
     fig.update_yaxes(title_text='Número de casos ou óbitos', secondary_y=False)
     fig.update_yaxes(title_text='Taxa média de isolamento há 2 semanas (%)', secondary_y=True)
@@ -2086,31 +3008,27 @@ def gera_evolucao_estado(evolucao_estado):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/evolucao-estado.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(selector=dict(type='scatter'), mode='lines')
-
-    fig.update_xaxes(nticks=5)
+    def versao_mobile(fig):
+        fig.update_traces(selector=dict(type='scatter'), mode='lines')
 
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_xaxes(nticks=5)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/evolucao-estado-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'evolucao-estado', versao_mobile)
 
 
 def gera_evolucao_cidade(evolucao_cidade):
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
-    grafico = evolucao_cidade
+    grafico = evolucao_cidade.copy()
+    grafico['data'] = grafico.semana.apply(lambda s: _formata_semana_extenso(s))
 
     fig.add_trace(go.Scatter(x=grafico['data'], y=grafico['isolamento'], line=dict(color='orange'),
                              name='isolamento médio<br>de 2 semanas atrás', hovertemplate='%{y:.2f}%',
@@ -2146,22 +3064,7 @@ def gera_evolucao_cidade(evolucao_cidade):
                          marker_color='green', textposition='outside', name='novas internações<br>na semana atual',
                          text=grafico['variacao_internacoes'].apply(lambda v: _formata_variacao(v))))
 
-    d = grafico.data.size
-
-    frames = [dict(data=[dict(type='scatter', x=grafico.data[:d + 1], y=grafico.isolamento[:d + 1]),
-                         dict(type='scatter', x=grafico.data[:d + 1], y=grafico.uti[:d + 1]),
-                         dict(type='scatter', x=grafico.data[:d + 1], y=grafico.perc_imu_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.casos_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.obitos_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.vacinadas_semana[:d + 1]),
-                         dict(type='bar', x=grafico.data[:d + 1], y=grafico.internacoes_semana[:d + 1])],
-                   traces=[0, 1, 2, 3, 4, 5, 6],
-                   ) for d in range(0, d)]
-
-    fig.frames = frames
-
-    botoes = [dict(label='Animar', method='animate',
-                   args=[None, dict(frame=dict(duration=400, redraw=True), fromcurrent=True, mode='immediate')])]
+    botoes = [cria_botao_animacao([0, 1, 2, 3, 4, 5, 6], 400)]
 
     fig.update_yaxes(title_text='Número de casos ou óbitos', secondary_y=False)
     fig.update_yaxes(title_text='Taxa média de isolamento há 2 semanas (%)', secondary_y=True)
@@ -2184,25 +3087,20 @@ def gera_evolucao_cidade(evolucao_cidade):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/evolucao-cidade.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(selector=dict(type='scatter'), mode='lines')
+    def versao_mobile(fig):
+        fig.update_traces(selector=dict(type='scatter'), mode='lines')
 
-    fig.update_xaxes(nticks=5)
+        fig.update_xaxes(nticks=5)
 
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
-
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/evolucao-cidade-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'evolucao-cidade', versao_mobile)
 
 
 def gera_leitos_estaduais(leitos):
@@ -2237,111 +3135,102 @@ def gera_leitos_estaduais(leitos):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/leitos-estaduais.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(mode='lines')
-
-    fig.update_xaxes(nticks=10)
+    def versao_mobile(fig):
+        fig.update_traces(mode='lines')
 
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/leitos-estaduais-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'leitos-estaduais', versao_mobile)
 
 
-def gera_drs(internacoes):
+def gera_drs(visao_internacoes):
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     # lista de Departamentos Regionais de Saúde
-    l_drs = list(internacoes.drs.sort_values(ascending=False).unique())
-
-    # series em vez de list, para que seja possível utilizar o método isin
-    s_drs = pd.Series(l_drs)
+    l_drs = sorted(visao_internacoes['entidades'], reverse=True)
 
     titulo_a = 'Departamento Regional de Saúde - '
     titulo_b = '<br><i>Fonte: <a href = "https://www.seade.gov.br/coronavirus/">Governo do Estado de São Paulo</a></i>'
 
-    for d in l_drs:
-        grafico = internacoes[internacoes.drs == d]
+    series = divide_por_entidade(visao_internacoes, visao_internacoes['dados'])
+
+    # cada trace leva no meta o índice da sua DRS, usado pelas opções do menu
+    for i, d in enumerate(l_drs):
+        grafico = series[d]
         mostrar = d == 'Estado de São Paulo'
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['pacientes_uti_mm7d'],
                                  name='pacientes internados em leitos<br>de UTI para Covid-19 - média<br>móvel dos últimos 7 dias',
-                                 mode='lines+markers', hovertemplate='%{y:.0f}', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', hovertemplate='%{y:.0f}', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['pacientes_uti_ultimo_dia'],
                                  name='pacientes internados em leitos<br>de UTI para Covid-19<br>no dia anterior',
-                                 mode='lines+markers', hovertemplate='%{y:.0f}', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', hovertemplate='%{y:.0f}', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['total_covid_uti_mm7d'],
                                  name='leitos Covid-19 - média<br>móvel dos últimos 7 dias',
-                                 mode='lines+markers', hovertemplate='%{y:.0f}', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', hovertemplate='%{y:.0f}', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['total_covid_uti_ultimo_dia'],
                                  name='leitos Covid-19<br>no dia anterior',
-                                 mode='lines+markers', hovertemplate='%{y:.0f}', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', hovertemplate='%{y:.0f}', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['ocupacao_leitos'],
                                  name='ocupação de leitos de<br>UTI para Covid-19 - média<br>móvel dos últimos 7 dias',
-                                 mode='lines+markers', hovertemplate='%{y:.2f}%', customdata=[d], visible=mostrar),
+                                 mode='lines+markers', hovertemplate='%{y:.2f}%', meta=i, visible=mostrar),
                       secondary_y=True)
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['ocupacao_leitos_ultimo_dia'],
                                  name='ocupação de leitos de<br>UTI para Covid-19<br>no dia anterior',
-                                 mode='lines+markers', hovertemplate='%{y:.2f}%', customdata=[d], visible=mostrar),
+                                 mode='lines+markers', hovertemplate='%{y:.2f}%', meta=i, visible=mostrar),
                       secondary_y=True)
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['leitos_pc'], name='leitos Covid-19 para<br>cada 100 mil habitantes',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['internacoes_7d'],
                                  name='internações (UTI e enfermaria,<br>confirmados e suspeitos)<br>média móvel dos últimos 7 dias',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['internacoes_7d_l'],
                                  name='internações (UTI e enfermaria,<br>confirmados e suspeitos)<br>média móvel dos 7 dias<br>anteriores',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['internacoes_7v7'],
                                  name='variação do número<br>de internações 7 dias',
-                                 mode='lines+markers', hovertemplate='%{y:.1f}%', customdata=[d], visible=mostrar),
+                                 mode='lines+markers', hovertemplate='%{y:.1f}%', meta=i, visible=mostrar),
                       secondary_y=True)
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['internacoes_ultimo_dia'],
                                  name='internações (UTI e enfermaria,<br>confirmados e suspeitos)<br>no último dia',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['pacientes_enf_mm7d'],
                                  name='pacientes enfermaria - <br>média móvel dos últimos 7 dias',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['total_covid_enf_mm7d'],
                                  name='leitos enfermaria - <br>média móvel dos últimos 7 dias',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['pacientes_enf_ultimo_dia'],
                                  name='pacientes em enfermaria<br>no último dia',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
         fig.add_trace(go.Scatter(x=grafico['dia'], y=grafico['total_covid_enf_ultimo_dia'],
                                  name='leitos de enfermaria<br>no último dia',
-                                 mode='lines+markers', customdata=[d], visible=mostrar))
+                                 mode='lines+markers', meta=i, visible=mostrar))
 
-    def cria_lista_opcoes(drs):
-        return dict(label=drs,
-                    method='update',
-                    args=[{'visible': [True if drs in trace['customdata'] else False for trace in fig._data]},
-                          {'title.text': titulo_a + drs + titulo_b},
-                          {'showlegend': True}])
+    def cria_lista_opcoes(i, drs):
+        return cria_opcao_grupos(drs, [i], {'title.text': titulo_a + drs + titulo_b})
 
     fig.update_layout(
         font=dict(family='Roboto'),
@@ -2352,7 +3241,7 @@ def gera_drs(internacoes):
         template='plotly',
         updatemenus=[go.layout.Updatemenu(active=6,
                                           showactive=True,
-                                          buttons=list(s_drs.apply(lambda d: cria_lista_opcoes(d))),
+                                          buttons=[cria_lista_opcoes(i, d) for i, d in enumerate(l_drs)],
                                           x=0.001, xanchor='left',
                                           y=0.990, yanchor='top')],
         height=600
@@ -2363,23 +3252,20 @@ def gera_drs(internacoes):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/drs.html', include_plotlyjs='directory', auto_open=False)
-
     # versão mobile
-    fig.update_traces(mode='lines+text')
+    def versao_mobile(fig):
+        fig.update_traces(mode='lines+text')
 
-    fig.update_xaxes(nticks=10)
-
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/drs-mobile.html', include_plotlyjs='directory', auto_open=False)
+    grava_grafico(fig, 'drs', versao_mobile)
 
 
 def gera_leitos_municipais(leitos):
@@ -2408,22 +3294,7 @@ def gera_leitos_municipais(leitos):
     fig.add_trace(go.Scatter(x=leitos['dia'], y=leitos['suspeitos_publico'], visible='legendonly',
                              mode='lines+markers', name='pacientes atendidos com<br>suspeita de Covid-19'))
 
-    d = leitos.dia.size
-
-    frames = [dict(data=[dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.ocupacao_uti_covid_publico[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.uti_covid_publico[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.internados_uti_publico[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.ventilacao_publico[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.internados_publico[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.respiratorio_publico[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.suspeitos_publico[:d + 1])],
-                   traces=[0, 1, 2, 3, 4, 5, 6],
-                   ) for d in range(0, d)]
-
-    fig.frames = frames
-
-    botoes = [dict(label='Animar', method='animate',
-                   args=[None, dict(frame=dict(duration=200, redraw=True), fromcurrent=True, mode='immediate')])]
+    botoes = [cria_botao_animacao([0, 1, 2, 3, 4, 5, 6], 200)]
 
     fig.update_layout(
         font=dict(family='Roboto'),
@@ -2448,25 +3319,20 @@ def gera_leitos_municipais(leitos):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/leitos-municipais.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(mode='lines')
-
-    fig.update_xaxes(nticks=10)
+    def versao_mobile(fig):
+        fig.update_traces(mode='lines')
 
-    fig.update_layout(
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=20),
-        showlegend=False,
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=20),
+            showlegend=False,
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/leitos-municipais-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'leitos-municipais', versao_mobile)
 
 
 def gera_leitos_municipais_privados(leitos):
@@ -2495,22 +3361,7 @@ def gera_leitos_municipais_privados(leitos):
     fig.add_trace(go.Scatter(x=leitos['dia'], y=leitos['suspeitos_privado'], visible='legendonly',
                              mode='lines+markers', name='pacientes atendidos com<br>suspeita de Covid-19'))
 
-    d = leitos.dia.size
-
-    frames = [dict(data=[dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.ocupacao_uti_covid_privado[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.uti_covid_privado[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.internados_uti_privado[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.ventilacao_privado[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.internados_privado[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.respiratorio_privado[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.suspeitos_privado[:d + 1])],
-                   traces=[0, 1, 2, 3, 4, 5, 6],
-                   ) for d in range(0, d)]
-
-    fig.frames = frames
-
-    botoes = [dict(label='Animar', method='animate',
-                   args=[None, dict(frame=dict(duration=200, redraw=True), fromcurrent=True, mode='immediate')])]
+    botoes = [cria_botao_animacao([0, 1, 2, 3, 4, 5, 6], 200)]
 
     fig.update_layout(
         font=dict(family='Roboto'),
@@ -2535,25 +3386,20 @@ def gera_leitos_municipais_privados(leitos):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/leitos-municipais-privados.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(mode='lines')
-
-    fig.update_xaxes(nticks=10)
+    def versao_mobile(fig):
+        fig.update_traces(mode='lines')
 
-    fig.update_layout(
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=20),
-        showlegend=False,
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=20),
+            showlegend=False,
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/leitos-municipais-privados-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'leitos-municipais-privados', versao_mobile)
 
 
 def gera_leitos_municipais_total(leitos):
@@ -2582,22 +3428,7 @@ def gera_leitos_municipais_total(leitos):
     fig.add_trace(go.Scatter(x=leitos['dia'], y=leitos['suspeitos_total'], visible='legendonly',
                              mode='lines+markers', name='pacientes atendidos com<br>suspeita de Covid-19'))
 
-    d = leitos.dia.size
-
-    frames = [dict(data=[dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.ocupacao_uti_covid_total[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.uti_covid_total[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.internados_uti_total[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.ventilacao_total[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.internados_total[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.respiratorio_total[:d + 1]),
-                         dict(type='scatter', x=leitos.dia[:d + 1], y=leitos.suspeitos_total[:d + 1])],
-                   traces=[0, 1, 2, 3, 4, 5, 6],
-                   ) for d in range(0, d)]
-
-    fig.frames = frames
-
-    botoes = [dict(label='Animar', method='animate',
-                   args=[None, dict(frame=dict(duration=200, redraw=True), fromcurrent=True, mode='immediate')])]
+    botoes = [cria_botao_animacao([0, 1, 2, 3, 4, 5, 6], 200)]
 
     fig.update_layout(
         font=dict(family='Roboto'),
@@ -2622,25 +3453,20 @@ def gera_leitos_municipais_total(leitos):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/leitos-municipais-total.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(mode='lines')
-
-    fig.update_xaxes(nticks=10)
+    def versao_mobile(fig):
+        fig.update_traces(mode='lines')
 
-    fig.update_layout(
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=20),
-        showlegend=False,
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=20),
+            showlegend=False,
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/leitos-municipais-total-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'leitos-municipais-total', versao_mobile)
 
 
 def gera_hospitais_campanha(hospitais_campanha):
@@ -2676,23 +3502,7 @@ def gera_hospitais_campanha(hospitais_campanha):
                                  name='pacientes em processo de<br>transferência para internação<br>no HMCamp',
                                  visible='legendonly'))
 
-        d = grafico.dia.size
-
-        frames = [dict(data=[dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.comum[:d + 1]),
-                             dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.ocupação_comum[:d + 1]),
-                             dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.uti[:d + 1]),
-                             dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.ocupação_uti[:d + 1]),
-                             dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.altas[:d + 1]),
-                             dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.óbitos[:d + 1]),
-                             dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.transferidos[:d + 1]),
-                             dict(type='scatter', x=grafico.dia[:d + 1], y=grafico.chegando[:d + 1])],
-                       traces=[0, 1, 2, 3, 4, 5, 6, 7],
-                       ) for d in range(0, d)]
-
-        fig.frames = frames
-
-        botoes = [dict(label='Animar', method='animate',
-                       args=[None, dict(frame=dict(duration=200, redraw=True), fromcurrent=True, mode='immediate')])]
+        botoes = [cria_botao_animacao([0, 1, 2, 3, 4, 5, 6, 7], 200)]
 
         fig.update_layout(
             font=dict(family='Roboto'),
@@ -2714,25 +3524,20 @@ def gera_hospitais_campanha(hospitais_campanha):
 
         # fig.show()
 
-        pio.write_html(fig, file='docs/graficos/' + h.lower() + '.html',
-                       include_plotlyjs='directory', auto_open=False, auto_play=False)
-
         # versão mobile
-        fig.update_traces(mode='lines')
-
-        fig.update_xaxes(nticks=10)
+        def versao_mobile(fig):
+            fig.update_traces(mode='lines')
 
-        fig.update_layout(
-            showlegend=False,
-            font=dict(size=11, family='Roboto'),
-            margin=dict(l=1, r=1, b=1, t=90, pad=20),
-            height=400
-        )
+            fig.update_xaxes(nticks=10)
 
-        # fig.show()
+            fig.update_layout(
+                showlegend=False,
+                font=dict(size=11, family='Roboto'),
+                margin=dict(l=1, r=1, b=1, t=90, pad=20),
+                height=400
+            )
 
-        pio.write_html(fig, file='docs/graficos/' + h.lower() + '-mobile.html',
-                       include_plotlyjs='directory', auto_open=False, auto_play=False)
+        grava_grafico(fig, h.lower(), versao_mobile)
 
 
 def gera_evolucao_vacinacao_estado(dados_vacinacao):
@@ -2740,9 +3545,9 @@ def gera_evolucao_vacinacao_estado(dados_vacinacao):
     dados = dados[1:]
 
     media_movel = dados.loc[:, ['data', 'aplicadas_dia']].rolling('7D', on='data').mean()
-    media_movel['data'] = media_movel.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    media_movel['data'] = formata_datas(media_movel.data, '%d/%b/%y')
 
-    dados['data'] = dados.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados['data'] = formata_datas(dados.data, '%d/%b/%y')
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
@@ -2807,25 +3612,20 @@ def gera_evolucao_vacinacao_estado(dados_vacinacao):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/vacinacao-estado.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(selector=dict(type='scatter'), mode='lines')
-
-    fig.update_xaxes(nticks=10)
+    def versao_mobile(fig):
+        fig.update_traces(selector=dict(type='scatter'), mode='lines')
 
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/vacinacao-estado-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'vacinacao-estado', versao_mobile)
 
 
 def gera_evolucao_vacinacao_cidade(dados_vacinacao):
@@ -2833,9 +3633,9 @@ def gera_evolucao_vacinacao_cidade(dados_vacinacao):
     dados = dados[1:]
 
     media_movel = dados.loc[:, ['data', 'aplicadas_dia']].rolling('7D', on='data').mean()
-    media_movel['data'] = dados.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    media_movel['data'] = formata_datas(dados.data, '%d/%b/%y')
 
-    dados['data'] = dados.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados['data'] = formata_datas(dados.data, '%d/%b/%y')
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
@@ -2900,25 +3700,20 @@ def gera_evolucao_vacinacao_cidade(dados_vacinacao):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/vacinacao-cidade.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_traces(selector=dict(type='scatter'), mode='lines')
+    def versao_mobile(fig):
+        fig.update_traces(selector=dict(type='scatter'), mode='lines')
 
-    fig.update_xaxes(nticks=10)
-
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        height=400
-    )
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/vacinacao-cidade-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'vacinacao-cidade', versao_mobile)
 
 
 def gera_populacao_vacinada(dados):
@@ -2927,10 +3722,10 @@ def gera_populacao_vacinada(dados):
     filtro_cidade = dados.municipio == 'SAO PAULO'
 
     dados_estado = dados.loc[filtro_data & filtro_estado].copy()
-    dados_estado.loc[:, 'data'] = dados_estado.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados_estado.loc[:, 'data'] = formata_datas(dados_estado.data, '%d/%b/%y')
 
     dados_cidade = dados.loc[filtro_data & filtro_cidade].copy()
-    dados_cidade.loc[:, 'data'] = dados_cidade.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados_cidade.loc[:, 'data'] = formata_datas(dados_cidade.data, '%d/%b/%y')
 
     fig = make_subplots(rows=1, cols=2, specs=[[{'type': 'domain'}, {'type': 'domain'}]])
 
@@ -3004,28 +3799,23 @@ def gera_populacao_vacinada(dados):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/populacao-vacinada.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        annotations=[dict(text='Estado', x=0.17, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False),
-                     dict(text='Cidade', x=0.85, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False)],
-        height=400,
-        updatemenus=[go.layout.Updatemenu(active=0,
-                                          buttons=[opcao_dose1, opcao_dose2, opcao_dose3,
-                                                   opcao_dose4, opcao_dose5, opcao_dose6],
-                                          x=0.001, xanchor='left',
-                                          y=0.990, yanchor='top')],
-    )
-
-    # fig.show()
+    def versao_mobile(fig):
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            annotations=[dict(text='Estado', x=0.17, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False),
+                         dict(text='Cidade', x=0.85, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False)],
+            height=400,
+            updatemenus=[go.layout.Updatemenu(active=0,
+                                              buttons=[opcao_dose1, opcao_dose2, opcao_dose3,
+                                                       opcao_dose4, opcao_dose5, opcao_dose6],
+                                              x=0.001, xanchor='left',
+                                              y=0.990, yanchor='top')],
+        )
 
-    pio.write_html(fig, file='docs/graficos/populacao-vacinada-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'populacao-vacinada', versao_mobile)
 
 
 def gera_tipo_doses(dados):
@@ -3034,10 +3824,10 @@ def gera_tipo_doses(dados):
     filtro_cidade = dados.municipio == 'SAO PAULO'
 
     dados_estado = dados.loc[filtro_data & filtro_estado].copy()
-    dados_estado.loc[:, 'data'] = dados_estado.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados_estado.loc[:, 'data'] = formata_datas(dados_estado.data, '%d/%b/%y')
 
     dados_cidade = dados.loc[filtro_data & filtro_cidade].copy()
-    dados_cidade.loc[:, 'data'] = dados_cidade.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados_cidade.loc[:, 'data'] = formata_datas(dados_cidade.data, '%d/%b/%y')
 
     rotulos = ['1ª dose', '2ª dose', '3ª dose', '4ª dose', '5ª dose', '6ª dose', 'Dose única']
     pizza_estado = [dados_estado['1a_dose'].item(), dados_estado['2a_dose'].item(), dados_estado['3a_dose'].item(),
@@ -3068,23 +3858,18 @@ def gera_tipo_doses(dados):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/vacinas-tipo.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        annotations=[dict(text='Estado', x=0.17, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False),
-                     dict(text='Cidade', x=0.85, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False)],
-        height=400
-    )
-
-    # fig.show()
+    def versao_mobile(fig):
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            annotations=[dict(text='Estado', x=0.17, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False),
+                         dict(text='Cidade', x=0.85, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False)],
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/vacinas-tipo-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'vacinas-tipo', versao_mobile)
 
 
 def gera_doses_aplicadas(dados):
@@ -3093,10 +3878,10 @@ def gera_doses_aplicadas(dados):
     filtro_cidade = dados.municipio == 'SAO PAULO'
 
     dados_estado = dados.loc[filtro_data & filtro_estado].copy()
-    dados_estado.loc[:, 'data'] = dados_estado.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados_estado.loc[:, 'data'] = formata_datas(dados_estado.data, '%d/%b/%y')
 
     dados_cidade = dados.loc[filtro_data & filtro_cidade].copy()
-    dados_cidade.loc[:, 'data'] = dados_cidade.data.apply(lambda dt: dt.strftime('%d/%b/%y'))
+    dados_cidade.loc[:, 'data'] = formata_datas(dados_cidade.data, '%d/%b/%y')
 
     rotulos = ['doses aplicadas', 'doses disponíveis para aplicação']
     pizza_estado = [dados_estado['total_doses'].item(), dados_estado['doses_recebidas'].item() - dados_estado['total_doses'].item()]
@@ -3123,23 +3908,18 @@ def gera_doses_aplicadas(dados):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/vacinas-aplicadas.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
-
     # versão mobile
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=10),
-        annotations=[dict(text='Estado', x=0.17, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False),
-                     dict(text='Cidade', x=0.85, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False)],
-        height=400
-    )
-
-    # fig.show()
+    def versao_mobile(fig):
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=10),
+            annotations=[dict(text='Estado', x=0.17, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False),
+                         dict(text='Cidade', x=0.85, y=0.5, font=dict(size=9, family='Roboto'), showarrow=False)],
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/vacinas-aplicadas-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'vacinas-aplicadas', versao_mobile)
 
 
 def gera_tabela_vacinacao(dados):
@@ -3239,12 +4019,15 @@ def gera_tabela_vacinacao(dados):
     with open('docs/graficos/tabela-vacinacao-mobile.html', 'w+', encoding='utf-8') as fo:
         fo.write(html_inicial + html_tabela + html_final)
 
+    registra_arquivo('docs/graficos/tabela-vacinacao.html')
+    registra_arquivo('docs/graficos/tabela-vacinacao-mobile.html')
+
 
 def gera_distribuicao_imunizantes(dados_imunizantes):
     fig = go.Figure()
 
     for v in dados_imunizantes['vacina'].unique():
-        fig.add_trace(go.Scatter(x=dados_imunizantes.loc[dados_imunizantes['vacina'] == v, 'data'].apply(lambda d: d.strftime('%d/%b/%y')),
+        fig.add_trace(go.Scatter(x=formata_datas(dados_imunizantes.loc[dados_imunizantes['vacina'] == v, 'data'], '%d/%b/%y'),
                                  y=dados_imunizantes.loc[dados_imunizantes['vacina'] == v, 'aplicadas'],
                                  mode='lines', line=dict(width=0.5), stackgroup='one', name=v,
                                  text=dados_imunizantes.loc[dados_imunizantes['vacina'] == v, 'aplicadas'] \
@@ -3275,23 +4058,18 @@ def gera_distribuicao_imunizantes(dados_imunizantes):
 
     # fig.show()
 
-    pio.write_html(fig, file='docs/graficos/imunizantes.html', include_plotlyjs='directory',
-                   auto_open=False)
-
     # versão mobile
-    fig.update_xaxes(nticks=10)
-
-    fig.update_layout(
-        showlegend=False,
-        font=dict(size=11, family='Roboto'),
-        margin=dict(l=1, r=1, b=1, t=90, pad=1),
-        height=400
-    )
+    def versao_mobile(fig):
+        fig.update_xaxes(nticks=10)
 
-    # fig.show()
+        fig.update_layout(
+            showlegend=False,
+            font=dict(size=11, family='Roboto'),
+            margin=dict(l=1, r=1, b=1, t=90, pad=1),
+            height=400
+        )
 
-    pio.write_html(fig, file='docs/graficos/imunizantes-mobile.html',
-                   include_plotlyjs='directory', auto_open=False, auto_play=False)
+    grava_grafico(fig, 'imunizantes', versao_mobile)
 
 
 def atualiza_service_worker(dados_estado):
@@ -3323,13 +4101,26 @@ def atualiza_service_worker(dados_estado):
 if __name__ == '__main__':
     processa_doencas = False
     vacinacao = False
+    vacinacao_todos_municipios = False
+    # quantidade de processos para gerar os gráficos (1: sequencial; None: um por núcleo)
+    processos_graficos = 1
+
+    data_processamento = datetime.now()
+
+    argumentos = sys.argv[1:]
+
+    # --todos-municipios: atualiza a campanha de vacinação de todos os municípios, e não só da capital
+    if '--todos-municipios' in argumentos:
+        argumentos.remove('--todos-municipios')
+        vacinacao_todos_municipios = True
+
+    # --processos-graficos=N: gera os gráficos em N processos (0: um por núcleo)
+    for argumento in [a for a in argumentos if a.startswith('--processos-graficos=')]:
+        argumentos.remove(argumento)
+        processos_graficos = int(argumento.split('=', 1)[1]) or None
 
-    if len(sys.argv) == 1:
-        data_processamento = datetime.now()
+    if len(argumentos) == 0:
         main()
     else:
-        for i in range(int(sys.argv[1]), -1, -1):
-            data_processamento = datetime.now() - timedelta(days=i)
-            print(f'\nDia em processamento -> {data_processamento:%d/%m/%Y}\n')
-            main()
+        main(int(argumentos[0]))
 
@@ -109,18 +109,44 @@ function criaLink(descricao, linkDesktop) {
 	divConteudo.insertAdjacentElement('beforeEnd', divSubTitulo);
 }
 
-function criaIFrame(linkDesktop, linkMobile, versaoMobile) {	
+function aplicaAjusteMobile(iframe) {
+	//os gráficos são gravados uma única vez; a versão para celulares é um conjunto de ajustes de layout e de traces
+	var janela = iframe.contentWindow;
+	var ajuste = janela.ajusteMobile;
+	var grafico = iframe.contentDocument.querySelector('.plotly-graph-div');
+	
+	if(!ajuste || !grafico)
+		return Promise.resolve();
+	
+	//o gráfico só é desenhado depois que o carrega-dados.js busca as colunas de dados
+	return Promise.resolve(janela.graficoPronto).then(function() {
+		var atualizacoes = ajuste.traces.map(function(grupo) {
+			return janela.Plotly.restyle(grafico, grupo[0], grupo[1]);
+		});
+		
+		return Promise.all(atualizacoes);
+	}).then(function() {
+		return janela.Plotly.relayout(grafico, ajuste.layout);
+	});
+}
+
+//linkMobile: página própria para celulares, usada pelos gráficos que não são refeitos em toda execução
+function criaIFrame(linkDesktop, versaoMobile, linkMobile) {	
 	var iframe = document.createElement('iframe');
-	iframe.src = versaoMobile ? linkMobile : linkDesktop;
+	iframe.src = versaoMobile && linkMobile ? linkMobile : linkDesktop;
 	iframe.style.display = 'block';
 	iframe.style.border = 'none';
 	iframe.style.width = 1200;
-	iframe.onload = function(iframe, versaoMobile) {
-		var altura = iframe.currentTarget.contentDocument.body.scrollHeight;
-		if(altura < 256) altura = 500;
-		if(altura > 800) altura = 650;
-		iframe.srcElement.height = altura;
-		iframe.srcElement.style.height = altura;
+	iframe.onload = function() {
+		var ajuste = versaoMobile && !linkMobile ? aplicaAjusteMobile(iframe) : Promise.resolve(iframe.contentWindow.graficoPronto);
+		
+		ajuste.then(function() {
+			var altura = iframe.contentDocument.body.scrollHeight;
+			if(altura < 256) altura = 500;
+			if(altura > 800) altura = 650;
+			iframe.height = altura;
+			iframe.style.height = altura;
+		});
 	}
 
 	var divConteudo = document.getElementById('conteudo');
@@ -138,17 +164,17 @@ function montaPagina(pagina) {
 			criaTitulo('Campanha de vacinação');
 			
 			criaLink('Ampliar resumo da campanha de vacinação', 'graficos/resumo-vacinacao.html');
-			criaIFrame('graficos/resumo-vacinacao.html', 'graficos/resumo-vacinacao-mobile.html', versaoMobile);
+			criaIFrame('graficos/resumo-vacinacao.html', versaoMobile, 'graficos/resumo-vacinacao-mobile.html');
 			
 			criaTitulo('Semana Epidemiológica');
 			
 			criaLink('Ampliar resumo semanal', 'graficos/resumo-semanal.html');
-			criaIFrame('graficos/resumo-semanal.html', 'graficos/resumo-semanal-mobile.html', versaoMobile);
+			criaIFrame('graficos/resumo-semanal.html', versaoMobile);
 			
 			criaTitulo('Resumo diário');
 			
 			criaLink('Ampliar resumo diário', 'graficos/resumo.html');
-			criaIFrame('graficos/resumo.html', 'graficos/resumo-mobile.html', versaoMobile);
+			criaIFrame('graficos/resumo.html', versaoMobile);
 			
 			break;
 			
@@ -156,35 +182,35 @@ function montaPagina(pagina) {
 			criaTitulo('Evolução da pandemia');
 			
 			criaLink('Ampliar gráfico da evolução da pandemia no estado', 'graficos/evolucao-estado.html');
-			criaIFrame('graficos/evolucao-estado.html', 'graficos/evolucao-estado-mobile.html', versaoMobile);
+			criaIFrame('graficos/evolucao-estado.html', versaoMobile);
 			
 			criaLink('Ampliar gráfico da evolução da pandemia na cidade', 'graficos/evolucao-cidade.html');
-			criaIFrame('graficos/evolucao-cidade.html', 'graficos/evolucao-cidade-mobile.html', versaoMobile);
+			criaIFrame('graficos/evolucao-cidade.html', versaoMobile);
 			
 			criaTitulo('Casos no Estado');
 			
 			criaLink('Ampliar gráfico de casos no estado', 'graficos/casos-estado.html');
-			criaIFrame('graficos/casos-estado.html', 'graficos/casos-estado-mobile.html', versaoMobile);
+			criaIFrame('graficos/casos-estado.html', versaoMobile);
 			
 			criaTitulo('Casos na Cidade');
 			
 			criaLink('Ampliar gráfico de casos na cidade', 'graficos/casos-cidade.html');
-			criaIFrame('graficos/casos-cidade.html', 'graficos/casos-cidade-mobile.html', versaoMobile);
+			criaIFrame('graficos/casos-cidade.html', versaoMobile);
 			
 			criaTitulo('Doenças preexistentes nos casos');
 			
 			criaLink('Ampliar gráfico de doenças preexistentes nos casos', 'graficos/doencas-casos.html');
-			criaIFrame('graficos/doencas-casos.html', 'graficos/doencas-casos-mobile.html', versaoMobile);
+			criaIFrame('graficos/doencas-casos.html', versaoMobile, 'graficos/doencas-casos-mobile.html');
 			
 			criaTitulo('Doenças preexistentes nos óbitos');
 			
 			criaLink('Ampliar gráfico de doenças preexistentes nos óbitos', 'graficos/doencas-obitos.html');
-			criaIFrame('graficos/doencas-obitos.html', 'graficos/doencas-obitos-mobile.html', versaoMobile);
+			criaIFrame('graficos/doencas-obitos.html', versaoMobile, 'graficos/doencas-obitos-mobile.html');
 			
 			criaTitulo('Raça/cor nos casos e óbitos');
 			
 			criaLink('Ampliar gráfico de raça/cor nos casos e óbitos', 'graficos/raca-cor.html');
-			criaIFrame('graficos/raca-cor.html', 'graficos/raca-cor-mobile.html', versaoMobile);
+			criaIFrame('graficos/raca-cor.html', versaoMobile);
 			
 			break;
 		
@@ -192,10 +218,10 @@ function montaPagina(pagina) {
 			criaTitulo('Adesão ao Isolamento Social');
 			
 			criaLink('Ampliar gráfico do isolamento social', 'graficos/isolamento.html');
-			criaIFrame('graficos/isolamento.html', 'graficos/isolamento-mobile.html', versaoMobile);
+			criaIFrame('graficos/isolamento.html', versaoMobile);
 			
 			criaLink('Ampliar tabela do isolamento social', 'graficos/tabela-isolamento.html');
-			criaIFrame('graficos/tabela-isolamento.html', 'graficos/tabela-isolamento-mobile.html', versaoMobile);
+			criaIFrame('graficos/tabela-isolamento.html', versaoMobile);
 			
 			break;
 			
@@ -203,35 +229,35 @@ function montaPagina(pagina) {
 			criaTitulo('Ocupação de leitos no Estado');
 			
 			criaLink('Ampliar gráfico de ocupação de leitos no estado', 'graficos/leitos-estaduais.html');
-			criaIFrame('graficos/leitos-estaduais.html', 'graficos/leitos-estaduais-mobile.html', versaoMobile);
+			criaIFrame('graficos/leitos-estaduais.html', versaoMobile);
 			
 			criaTitulo('Departamentos Regionais de Saúde');
 			
 			criaLink('Ampliar gráfico de leitos no DRS', 'graficos/drs.html');
-			criaIFrame('graficos/drs.html', 'graficos/drs-mobile.html', versaoMobile);
+			criaIFrame('graficos/drs.html', versaoMobile);
 			
 			criaTitulo('Ocupação de leitos públicos na Cidade');
 			
 			criaLink('Ampliar gráfico da situação dos hospitais municipais', 'graficos/leitos-municipais.html');
-			criaIFrame('graficos/leitos-municipais.html', 'graficos/leitos-municipais-mobile.html', versaoMobile);
+			criaIFrame('graficos/leitos-municipais.html', versaoMobile);
 			
 			criaTitulo('Ocupação de leitos privados contratados pela Prefeitura');
 			
 			criaLink('Ampliar gráfico da situação dos leitos privados', 'graficos/leitos-municipais-privados.html');
-			criaIFrame('graficos/leitos-municipais-privados.html', 'graficos/leitos-municipais-privados-mobile.html', versaoMobile);
+			criaIFrame('graficos/leitos-municipais-privados.html', versaoMobile);
 			
 			criaTitulo('Ocupação geral de leitos públicos e privados na Cidade');
 			
 			criaLink('Ampliar gráfico da situação dos leitos em geral', 'graficos/leitos-municipais-total.html');
-			criaIFrame('graficos/leitos-municipais-total.html', 'graficos/leitos-municipais-total-mobile.html', versaoMobile);
+			criaIFrame('graficos/leitos-municipais-total.html', versaoMobile);
 			
 			criaTitulo('Situação dos Hospitais Municipais de Campanha');
 			
 			criaLink('Ampliar gráfico do HMCamp do Pacaembu', 'graficos/pacaembu.html');
-			criaIFrame('graficos/pacaembu.html', 'graficos/pacaembu-mobile.html', versaoMobile);
+			criaIFrame('graficos/pacaembu.html', versaoMobile, 'graficos/pacaembu-mobile.html');
 			
 			criaLink('Ampliar gráfico do HMCamp do Anhembi', 'graficos/anhembi.html');
-			criaIFrame('graficos/anhembi.html', 'graficos/anhembi-mobile.html', versaoMobile);
+			criaIFrame('graficos/anhembi.html', versaoMobile, 'graficos/anhembi-mobile.html');
 			
 			break;
 			
@@ -239,22 +265,22 @@ function montaPagina(pagina) {
 			criaTitulo('Evolução da campanha de vacinação contra a Covid-19');
 			
 			criaLink('Ampliar gráfico da vacinação contra Covid-19 no estado', 'graficos/vacinacao-estado.html');
-			criaIFrame('graficos/vacinacao-estado.html', 'graficos/vacinacao-estado-mobile.html', versaoMobile);
+			criaIFrame('graficos/vacinacao-estado.html', versaoMobile, 'graficos/vacinacao-estado-mobile.html');
 			
 			criaLink('Ampliar gráfico da vacinação contra Covid-19 na cidade', 'graficos/vacinacao-cidade.html');
-			criaIFrame('graficos/vacinacao-cidade.html', 'graficos/vacinacao-cidade-mobile.html', versaoMobile);
+			criaIFrame('graficos/vacinacao-cidade.html', versaoMobile, 'graficos/vacinacao-cidade-mobile.html');
 			
 			criaLink('Ampliar gráfico da população vacinada contra Covid-19', 'graficos/populacao-vacinada.html');
-			criaIFrame('graficos/populacao-vacinada.html', 'graficos/populacao-vacinada-mobile.html', versaoMobile);
+			criaIFrame('graficos/populacao-vacinada.html', versaoMobile, 'graficos/populacao-vacinada-mobile.html');
 			
 			criaLink('Ampliar gráfico das doses de vacinas aplicadas', 'graficos/vacinas-tipo.html');
-			criaIFrame('graficos/vacinas-tipo.html', 'graficos/vacinas-tipo-mobile.html', versaoMobile);
+			criaIFrame('graficos/vacinas-tipo.html', versaoMobile, 'graficos/vacinas-tipo-mobile.html');
 			
 			criaLink('Ampliar gráfico das vacinas disponíveis x aplicadas', 'graficos/vacinas-aplicadas.html');
-			criaIFrame('graficos/vacinas-aplicadas.html', 'graficos/vacinas-aplicadas-mobile.html', versaoMobile);
+			criaIFrame('graficos/vacinas-aplicadas.html', versaoMobile, 'graficos/vacinas-aplicadas-mobile.html');
 			
 			criaLink('Ampliar gráfico dos imunizantes distribuídos', 'graficos/imunizantes.html');
-			criaIFrame('graficos/imunizantes.html', 'graficos/imunizantes-mobile.html', versaoMobile);
+			criaIFrame('graficos/imunizantes.html', versaoMobile, 'graficos/imunizantes-mobile.html');
 			
 			var descricao = '';
 			
@@ -264,7 +290,7 @@ function montaPagina(pagina) {
 				descricao = 'Ampliar tabela da vacinação nos municípios';
 			
 			criaLink(descricao, 'graficos/tabela-vacinacao.html');
-			criaIFrame('graficos/tabela-vacinacao.html', 'graficos/tabela-vacinacao-mobile.html', versaoMobile);
+			criaIFrame('graficos/tabela-vacinacao.html', versaoMobile, 'graficos/tabela-vacinacao-mobile.html');
 			
 			break;
 			
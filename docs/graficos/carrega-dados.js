@@ -0,0 +1,120 @@
+//as colunas de dados dos traces ficam em um arquivo separado do HTML do gráfico; cada trace indica, para cada
+//atributo (ex.: 'x', 'marker.color'), a posição da coluna correspondente
+function preencheTrace(trace, referencias, colunas) {
+	for(var atributo in referencias) {
+		var partes = atributo.split('.');
+		var alvo = trace;
+
+		for(var j = 0; j < partes.length - 1; j++) {
+			alvo[partes[j]] = alvo[partes[j]] || {};
+			alvo = alvo[partes[j]];
+		}
+
+		alvo[partes[partes.length - 1]] = colunas[referencias[atributo]];
+	}
+
+	return trace;
+}
+
+function buscaDados(arquivo) {
+	return fetch(arquivo).then(function(resposta) {
+		return resposta.json();
+	});
+}
+
+//opções de menu com method 'skip' indicam os grupos (meta) dos traces que ficam visíveis e, opcionalmente, o
+//arquivo com a série que é colocada em um dos traces antes de mostrá-lo
+function carregaOpcao(grafico, opcao) {
+	var serie = opcao.args[0];
+
+	if(opcao.method !== 'skip' || !serie || !serie.grupos)
+		return;
+
+	var escolha = grafico.opcoesEscolhidas = (grafico.opcoesEscolhidas || 0) + 1;
+	var dados = serie.arquivo ? buscaDados(serie.arquivo) : Promise.resolve(null);
+
+	return dados.then(function(dados) {
+		//outra opção foi escolhida enquanto o arquivo era carregado
+		if(escolha !== grafico.opcoesEscolhidas)
+			return;
+
+		var carregamento = Promise.resolve();
+
+		if(dados) {
+			var trace = preencheTrace({name: serie.name}, dados.traces[0], dados.colunas);
+			var atualizacao = {};
+
+			for(var atributo in trace)
+				atualizacao[atributo] = [trace[atributo]];
+
+			carregamento = Plotly.restyle(grafico, atualizacao, [serie.trace]);
+		}
+
+		return carregamento.then(function() {
+			var visiveis = grafico.data.map(function(t) {
+				return serie.grupos.indexOf(t.meta) >= 0;
+			});
+
+			return Plotly.update(grafico, {visible: visiveis}, opcao.args[1]);
+		});
+	});
+}
+
+//o botão 'Animar' (method 'skip') indica os traces que são revelados ponto a ponto e a duração de cada quadro; cada
+//quadro é montado só quando vai ser exibido, para que os dados de todos os quadros nunca fiquem na memória
+function animaGrafico(grafico, opcao) {
+	var animacao = opcao.args[0];
+
+	if(opcao.method !== 'skip' || !animacao || !animacao.animar)
+		return;
+
+	//as séries completas são guardadas antes da primeira animação, que altera os dados do gráfico
+	grafico.seriesCompletas = grafico.seriesCompletas || animacao.animar.map(function(i) {
+		return {x: grafico.data[i].x, y: grafico.data[i].y};
+	});
+
+	var execucao = grafico.animacoes = (grafico.animacoes || 0) + 1;
+	var total = grafico.seriesCompletas[0].x.length;
+
+	function exibeQuadro(k) {
+		//o botão foi clicado de novo: a animação anterior é interrompida
+		if(k > total || execucao !== grafico.animacoes)
+			return Promise.resolve();
+
+		var quadro = {
+			data: grafico.seriesCompletas.map(function(serie) {
+				return {x: serie.x.slice(0, k), y: serie.y.slice(0, k)};
+			}),
+			traces: animacao.animar
+		};
+
+		return Plotly.animate(grafico, [quadro], {frame: {duration: animacao.duracao, redraw: true}, mode: 'immediate'})
+			.then(function() {
+				return exibeQuadro(k + 1);
+			});
+	}
+
+	//o Plotly rejeita a promessa do quadro interrompido por uma nova animação
+	return exibeQuadro(1).catch(function() {});
+}
+
+function montaGrafico(arquivo, id, data, layout, config) {
+	window.graficoPronto = buscaDados(arquivo)
+		.then(function(dados) {
+			dados.traces.forEach(function(referencias, i) {
+				preencheTrace(data[i], referencias, dados.colunas);
+			});
+
+			return Plotly.newPlot(id, data, layout, config);
+		})
+		.then(function(grafico) {
+			grafico.on('plotly_buttonclicked', function(evento) {
+				carregaOpcao(grafico, evento.button);
+				animaGrafico(grafico, evento.button);
+			});
+
+			return grafico;
+		});
+
+	return window.graficoPronto;
+}
@@ -1,5 +1,8 @@
 const VERSAO = '06'
 const CACHE_NAME = 'Covid19-SP-18/11/2023-' + VERSAO;
+// os arquivos de dados dos gráficos têm o hash do conteúdo no endereço (?v=...): ficam em um cache próprio,
+// que não é apagado a cada nova versão do site
+const CACHE_DADOS = 'Covid19-SP-dados';
 
 const CACHE_URLS = [
 	'index.html',
@@ -8,53 +11,42 @@ const CACHE_URLS = [
 	'serviceWorker.js',
 	'app.js',
 	'graficos/plotly.min.js',
-	'graficos/anhembi-mobile.html',
+	'graficos/carrega-dados.js',
 	'graficos/anhembi.html',
-	'graficos/casos-cidade-mobile.html',
 	'graficos/casos-cidade.html',
-	'graficos/casos-estado-mobile.html',
 	'graficos/casos-estado.html',
-	'graficos/isolamento-mobile.html',
 	'graficos/isolamento.html',
-	'graficos/leitos-municipais-mobile.html',
 	'graficos/leitos-municipais.html',
-	'graficos/leitos-estaduais-mobile.html',
 	'graficos/leitos-estaduais.html',
-	'graficos/pacaembu-mobile.html',
 	'graficos/pacaembu.html',
-	'graficos/resumo-mobile.html',
 	'graficos/resumo.html',
-	'graficos/resumo-vacinacao-mobile.html',
 	'graficos/resumo-vacinacao.html',
-	'graficos/tabela-isolamento-mobile.html',
 	'graficos/tabela-isolamento.html',
 	'graficos/evolucao-estado.html',
-	'graficos/evolucao-estado-mobile.html',
 	'graficos/evolucao-cidade.html',
-	'graficos/evolucao-cidade-mobile.html',
-	'graficos/resumo-semanal-mobile.html',
 	'graficos/resumo-semanal.html',
-	'graficos/leitos-municipais-privados-mobile.html',
 	'graficos/leitos-municipais-privados.html',
-	'graficos/leitos-municipais-total-mobile.html',
 	'graficos/leitos-municipais-total.html',
-	'graficos/drs-mobile.html',
 	'graficos/drs.html',
-	'graficos/doencas-casos-mobile.html',
 	'graficos/doencas-casos.html',
-	'graficos/doencas-obitos-mobile.html',
 	'graficos/doencas-obitos.html',
-	'graficos/vacinacao-estado-mobile.html',
 	'graficos/vacinacao-estado.html',
-	'graficos/vacinacao-cidade-mobile.html',
 	'graficos/vacinacao-cidade.html',
-	'graficos/populacao-vacinada-mobile.html',
 	'graficos/populacao-vacinada.html',
-	'graficos/vacinas-aplicadas-mobile.html',
 	'graficos/vacinas-aplicadas.html',
-	'graficos/vacinas-tipo-mobile.html',
 	'graficos/vacinas-tipo.html',
 	'graficos/tabela_vacinacao.html',
+	'graficos/anhembi-mobile.html',
+	'graficos/pacaembu-mobile.html',
+	'graficos/resumo-vacinacao-mobile.html',
+	'graficos/doencas-casos-mobile.html',
+	'graficos/doencas-obitos-mobile.html',
+	'graficos/vacinacao-estado-mobile.html',
+	'graficos/vacinacao-cidade-mobile.html',
+	'graficos/populacao-vacinada-mobile.html',
+	'graficos/vacinas-aplicadas-mobile.html',
+	'graficos/vacinas-tipo-mobile.html',
+	'graficos/imunizantes-mobile.html',
 	'graficos/tabela-vacinacao-mobile.html',
 	'images/bg01.png',	
 	'icons/android-chrome-192x192.png',
@@ -84,7 +76,7 @@ self.addEventListener('activate', event => {
 	event.waitUntil(
 		caches.keys().then(function(cacheNames) {
 			return Promise.all(cacheNames.map(function(thisCacheName) {
-				if (thisCacheName !== CACHE_NAME) {
+				if (thisCacheName !== CACHE_NAME && thisCacheName !== CACHE_DADOS) {
 					console.log('O serviceWorker está excluindo o cache', thisCacheName);
 					return caches.delete(thisCacheName);
 				}
@@ -101,7 +93,10 @@ self.addEventListener('activate', event => {
 // a cache. If no response is found, it populates the cache with the
 // response from the network before returning it to the page.
 self.addEventListener('fetch', event => {
-	if(event.request.url.startsWith(self.location.origin)) {
+	if(event.request.url.startsWith(self.location.origin) && ehArquivoDados(event.request.url)) {
+		event.respondWith(buscaArquivoDados(event.request));
+	}
+	else if(event.request.url.startsWith(self.location.origin)) {
 		event.respondWith(
 			caches.match(event.request).then(cachedResponse => {
 				if(cachedResponse) {
@@ -125,3 +120,36 @@ self.addEventListener('fetch', event => {
 		);
 	}
 });
+
+function ehArquivoDados(endereco) {
+	var url = new URL(endereco);
+	return url.pathname.includes('/graficos/dados/') && url.searchParams.has('v');
+}
+
+// cada versão de um arquivo de dados é baixada uma única vez; ao gravar uma versão nova, as anteriores do
+// mesmo arquivo, que não são mais usadas pelos gráficos, são apagadas
+function buscaArquivoDados(requisicao) {
+	return caches.open(CACHE_DADOS).then(cache => {
+		return cache.match(requisicao).then(cachedResponse => {
+			if(cachedResponse)
+				return cachedResponse;
+
+			return fetch(requisicao).then(response => {
+				if(!response.ok)
+					return response;
+
+				var caminho = new URL(requisicao.url).pathname;
+
+				return cache.keys().then(requisicoes => {
+					var anteriores = requisicoes.filter(r => new URL(r.url).pathname === caminho && r.url !== requisicao.url);
+					return Promise.all(anteriores.map(r => cache.delete(r)));
+				})
+				.then(() => cache.put(requisicao, response.clone()))
+				.then(() => response);
+			});
+		});
+	})
+	.catch(function(err) {
+		console.log("O serviceWorker não conseguiu buscar dados.", err);
+	});
+}